@@ -0,0 +1,245 @@
+"""
+End-to-end benchmarks of the agent loop's own overhead.
+
+Drives CliChat against a ScriptedLLM and the real DocumentMCP server over
+stdio, so the numbers exclude model latency and need no network. Results
+are printed (or written with --output) as JSON for comparing commits:
+
+    python -m benchmarks.agent_loop --output before.json
+
+Read-only tool results are memoized by ToolManager, so repeated samples
+would otherwise measure cache hits. Every turn sample starts with an
+empty tool result cache and makes real tool round trips; only the
+"_memoized" scenario measures a warm cache.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Awaitable, Callable
+
+from benchmarks.scripted_llm import ScriptedLLM
+from core.base_llm import estimate_tokens
+from core.cli_chat import CliChat
+from mcp_client import MCPClient
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(ROOT, "mcp_server", "mcp_server.py")
+
+DOC_ID = "report.pdf"
+READ_CALL = ("read_doc_contents", {"doc_name": DOC_ID})
+INFO_CALL = ("get_doc_info", {"doc_name": DOC_ID})
+SEARCH_CALL = ("search_documents", {"query": "condenser tower"})
+
+
+def make_client() -> MCPClient:
+    # A fresh in-memory store per client keeps runs independent
+    return MCPClient(
+        command=sys.executable,
+        args=[SERVER_SCRIPT],
+        env={"DOCS_STORE": "memory"},
+    )
+
+
+def summarize(samples: list[float]) -> dict:
+    """Summary statistics of timings in seconds, reported in milliseconds."""
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[math.ceil(0.95 * len(ordered)) - 1] * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+    }
+
+
+async def timed(operation: Callable[[], Awaitable], repeat: int) -> list[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await operation()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def bench_startup(repeat: int) -> dict:
+    """Spawn the server, complete the handshake and fetch the tool list."""
+    connect, first_tools = [], []
+    for _ in range(repeat):
+        client = make_client()
+        start = time.perf_counter()
+        await client.connect()
+        connected = time.perf_counter()
+        await client.list_tools()
+        first_tools.append(time.perf_counter() - connected)
+        connect.append(connected - start)
+        await client.cleanup()
+    return {
+        "connect": summarize(connect),
+        "first_list_tools": summarize(first_tools),
+    }
+
+
+async def bench_tool_round_trip(client: MCPClient, repeat: int) -> dict:
+    """Latency of single tool calls, without the agent loop around them.
+
+    These go straight to the client, so ToolManager never memoizes them.
+    """
+    results = {}
+    for name, tool_input in (READ_CALL, INFO_CALL, SEARCH_CALL):
+        # The first search builds the index; keep it out of the samples
+        await client.call_tool(name, tool_input)
+        results[name] = summarize(
+            await timed(lambda: client.call_tool(name, tool_input), repeat)
+        )
+
+    concurrent = 8
+    results[f"{concurrent}_concurrent_{READ_CALL[0]}"] = summarize(
+        await timed(
+            lambda: asyncio.gather(
+                *(client.call_tool(*READ_CALL) for _ in range(concurrent))
+            ),
+            repeat,
+        )
+    )
+    return results
+
+
+async def bench_turns(client: MCPClient, repeat: int) -> dict:
+    """Wall time of whole turns; with a zero-latency model it is all overhead."""
+    scenarios = {
+        "text_only": ["Done."],
+        "one_tool": [[READ_CALL], "Done."],
+        "one_tool_memoized": [[READ_CALL], "Done."],
+        "three_tools_parallel": [[READ_CALL, INFO_CALL, SEARCH_CALL], "Done."],
+        "three_tools_sequential": [[READ_CALL], [INFO_CALL], [SEARCH_CALL], "Done."],
+    }
+    results = {}
+    for name, script in scenarios.items():
+        samples = []
+        for _ in range(repeat):
+            if not name.endswith("_memoized"):
+                client.invalidate_tool_results()
+            # A new chat per sample keeps history growth out of these numbers
+            chat = CliChat(client, {"doc_client": client}, ScriptedLLM(script))
+            start = time.perf_counter()
+            await chat.run(f"Tell me about @{DOC_ID}", on_text=lambda _: None)
+            samples.append(time.perf_counter() - start)
+        results[name] = summarize(samples)
+    return results
+
+
+async def run_conversation(client: MCPClient, turns: int) -> tuple[CliChat, list[float]]:
+    chat = CliChat(
+        client, {"doc_client": client}, ScriptedLLM([[READ_CALL], "Done."], repeat=True)
+    )
+    samples = []
+    for turn in range(turns):
+        # Every turn reads the document from the server, as if it changed
+        client.invalidate_tool_results()
+        start = time.perf_counter()
+        await chat.run(f"Question {turn} about @{DOC_ID}", on_text=lambda _: None)
+        samples.append(time.perf_counter() - start)
+    return chat, samples
+
+
+async def bench_history_growth(client: MCPClient, turns: int) -> dict:
+    """Per-turn cost as one conversation grows, and the memory it holds."""
+    chat, samples = await run_conversation(client, turns)
+
+    # Tracing slows everything down, so memory is measured in a second run
+    gc.collect()
+    tracemalloc.start()
+    traced_chat, _ = await run_conversation(client, turns)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del traced_chat
+
+    window = max(1, turns // 10)
+    first, last = samples[:window], samples[-window:]
+    return {
+        "turns": turns,
+        "first_turns": summarize(first),
+        "last_turns": summarize(last),
+        # How much slower a turn is at the end of the conversation
+        "slowdown": round(statistics.fmean(last) / statistics.fmean(first), 3),
+        "final_messages": len(chat.messages),
+        "final_input_tokens_estimate": estimate_tokens(chat.messages),
+        "retained_kib": round(current / 1024, 1),
+        "traced_peak_kib": round(peak / 1024, 1),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmarks(repeat: int, turns: int) -> dict:
+    results = {"startup": await bench_startup(max(1, repeat // 10))}
+    async with make_client() as client:
+        results["tool_round_trip"] = await bench_tool_round_trip(client, repeat)
+        results["turns"] = await bench_turns(client, repeat)
+        results["history_growth"] = await bench_history_growth(client, turns)
+
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            max_rss //= 1024
+        results["client_max_rss_kib"] = max_rss
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            # What turn and history samples measure; see the module docstring
+            "tool_results": "uncached, except turns.*_memoized",
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50, help="Samples per measurement.")
+    parser.add_argument("--turns", type=int, default=100, help="Turns in the history growth run.")
+    parser.add_argument("--output", help="Write results to this file instead of stdout.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmarks(args.repeat, args.turns))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
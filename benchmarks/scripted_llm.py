@@ -0,0 +1,106 @@
+import asyncio
+import itertools
+from typing import List, Union
+
+from anthropic.types import Message, TextBlock, ToolUseBlock, Usage
+
+from core.base_llm import BaseLLM
+
+# A step is either the final text of a turn, or a list of
+# (tool_name, tool_input) calls the model makes before continuing
+Step = Union[str, List[tuple[str, dict]]]
+
+
+class ScriptedLLM(BaseLLM):
+    """
+    LLM that replays canned responses, for measuring the agent loop
+    without a model or network.
+
+    Responses are anthropic Message objects, exactly as Claude returns
+    them, so the rest of the system does the same work it would in
+    production. latency adds a fixed sleep per call to model a remote
+    model; it is 0 by default so timings are pure overhead.
+    """
+
+    def __init__(self, script: List[Step], latency: float = 0.0, repeat: bool = False):
+        super().__init__(model="scripted")
+        self._steps = itertools.cycle(script) if repeat else iter(script)
+        self.latency = latency
+        self._ids = itertools.count()
+        self.calls = 0
+
+    def add_user_message(self, messages: list, message):
+        messages.append({
+            "role": "user",
+            "content": message.content if isinstance(message, Message) else message,
+        })
+
+    def add_assistant_message(self, messages: list, message):
+        messages.append({
+            "role": "assistant",
+            "content": message.content if isinstance(message, Message) else message,
+        })
+
+    def text_from_message(self, message: Message) -> str:
+        return "\n".join(
+            block.text for block in message.content if block.type == "text"
+        )
+
+    def _next_message(self) -> Message:
+        try:
+            step = next(self._steps)
+        except StopIteration:
+            raise RuntimeError("ScriptedLLM ran out of scripted responses") from None
+
+        self.calls += 1
+
+        if isinstance(step, str):
+            content = [TextBlock(type="text", text=step)]
+            stop_reason = "end_turn"
+        else:
+            content = [
+                ToolUseBlock(
+                    type="tool_use",
+                    id=f"toolu_{next(self._ids)}",
+                    name=name,
+                    input=tool_input,
+                )
+                for name, tool_input in step
+            ]
+            stop_reason = "tool_use"
+
+        return Message(
+            id=f"msg_{next(self._ids)}",
+            type="message",
+            role="assistant",
+            model=self.model,
+            content=content,
+            stop_reason=stop_reason,
+            usage=Usage(input_tokens=0, output_tokens=0),
+        )
+
+    def chat(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ) -> Message:
+        return self._next_message()
+
+    async def achat(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ) -> Message:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._next_message()
@@ -0,0 +1,176 @@
+"""
+Startup benchmarks: import cost and cold start to the first prompt.
+
+Every sample is a fresh interpreter, so nothing is served from modules
+already imported by this process. Results are JSON, like agent_loop:
+
+    python -m benchmarks.startup --budget-ms 3000
+
+With --budget-ms, the exit status is 1 when the median cold start is
+over budget, so the command can guard startup time in CI.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+from benchmarks.agent_loop import ROOT, SERVER_SCRIPT, git_commit, summarize
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# Mirrors main(): start the document server, import and build the provider
+# in a thread meanwhile, start model validation in the background without
+# waiting for it, then load what CliApp.initialize() needs.
+COLD_START_PROBE = f"""
+import asyncio, sys
+import main
+from mcp_client import MCPClient
+
+async def probe():
+    client = MCPClient(
+        command=sys.executable, args=[{SERVER_SCRIPT!r}], env={{"DOCS_STORE": "memory"}}
+    )
+    connecting = asyncio.create_task(client.connect())
+    service = await asyncio.to_thread(main.create_llm_service)
+    validating = asyncio.create_task(service.validate())
+    await connecting
+    await asyncio.gather(
+        client.read_resource("docs:://documents"), client.list_prompts()
+    )
+    print("ready", flush=True)
+    validating.cancel()
+    await client.cleanup()
+
+asyncio.run(probe())
+"""
+
+PROBE_ENV = {
+    "CLAUDE_MODEL": "startup-probe",
+    "ANTHROPIC_API_KEY": "startup-probe",
+    "LLM_CACHE_MODE": "off",
+}
+
+
+def run_python(args: list[str], env: dict | None = None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_profile(module: str, top: int = 15) -> dict:
+    """Cumulative import time of module, and the modules costing most."""
+    stderr = run_python(["-X", "importtime", "-c", f"import {module}"]).stderr
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent)))
+
+    # Top-level packages (least indented) are what the module pulls in itself
+    top_level = min(depth for *_, depth in entries)
+    packages = sorted(
+        (e for e in entries if e[3] == top_level + 2 or e[0] == module),
+        key=lambda e: e[2],
+        reverse=True,
+    )
+    return {
+        "total_ms": round(
+            sum(cumulative for _, _, cumulative, depth in entries if depth == top_level)
+            / 1000,
+            1,
+        ),
+        "slowest": [
+            {"module": name, "cumulative_ms": round(cumulative / 1000, 1)}
+            for name, _, cumulative, _ in packages[:top]
+        ],
+    }
+
+
+def wall_import(module: str, repeat: int) -> dict:
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    return summarize(
+        [float(run_python(["-c", code], PROBE_ENV).stdout) for _ in range(repeat)]
+    )
+
+
+def cold_start(repeat: int) -> dict:
+    """Seconds from launching the interpreter until the first prompt could show."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-c", COLD_START_PROBE],
+            cwd=ROOT,
+            env={**os.environ, **PROBE_ENV},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        # Skip the provider banner and anything else printed on the way
+        ready = any(line.strip() == "ready" for line in process.stdout)
+        samples.append(time.perf_counter() - start)
+        process.wait()
+        if not ready:
+            raise RuntimeError("Cold start probe failed; run it by hand to see why")
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="Samples per measurement.")
+    parser.add_argument("--budget-ms", type=float, help="Fail if the median cold start is slower.")
+    parser.add_argument("--output", help="Write results to this file instead of stdout.")
+    args = parser.parse_args()
+
+    results = {
+        "import_main": wall_import("main", args.repeat),
+        "import_profile": import_profile("main"),
+        "provider_imports": {
+            name: wall_import(module, args.repeat)
+            for name, module in (("claude", "core.claude"), ("ollama", "core.ollama"))
+        },
+        "cold_start": cold_start(args.repeat),
+    }
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    median_ms = results["cold_start"]["median_ms"]
+    if args.budget_ms is not None and median_ms > args.budget_ms:
+        print(
+            f"Cold start median {median_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,58 @@
+import json
 from abc import ABC, abstractmethod
-from typing import Optional, List, Dict, Any
+from contextvars import ContextVar
+from typing import Optional, List, Dict, Any, AsyncIterator
+
+from core.usage import Usage
+
+# The conversation (a Chat) making the current model call, or None for
+# one-off calls. Lets providers keep per-conversation state, such as the
+# Ollama adapter's converted history, when one instance serves many
+# conversations at once.
+current_conversation: ContextVar[Optional[object]] = ContextVar(
+    "current_conversation", default=None
+)
+
+
+def _jsonable(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    # Adapter blocks (e.g. OllamaMessage content) keep their fields as
+    # class attributes, so vars() would miss them
+    return {
+        key: getattr(value, key)
+        for key in ("type", "text", "id", "name", "input", "content")
+        if hasattr(value, key)
+    }
+
+
+def estimate_tokens(
+    messages: List[Dict[str, Any]],
+    system: Optional[str] = None,
+    tools: Optional[List[Dict[str, Any]]] = None,
+) -> int:
+    """Cheap local token estimate (~4 characters per token) for a request."""
+    payload = json.dumps(
+        {"messages": messages, "system": system, "tools": tools},
+        default=_jsonable,
+    )
+    return len(payload) // 4
+
+
+class StreamEvent:
+    """
+    One incremental piece of a streamed LLM response.
+
+    type is "text" (text holds a delta), "tool_use" (block holds a complete
+    tool_use block) or "message" (message holds the final response, shaped
+    like the return value of chat()). "message" is always the last event.
+    """
+
+    def __init__(self, type: str, text: str = "", block=None, message=None):
+        self.type = type
+        self.text = text
+        self.block = block
+        self.message = message
 
 
 class BaseLLM(ABC):
@@ -8,6 +61,13 @@ class BaseLLM(ABC):
     def __init__(self, model: str):
         self.model = model
 
+    async def validate(self) -> None:
+        """
+        Check that the model is reachable and usable, printing a warning if
+        not. Called once in the background during startup, alongside MCP
+        server startup; the default does nothing.
+        """
+
     @abstractmethod
     def add_user_message(self, messages: list, message) -> None:
         """
@@ -71,3 +131,99 @@ class BaseLLM(ABC):
         """
         pass
 
+    @abstractmethod
+    async def achat(
+        self,
+        messages: List[Dict[str, Any]],
+        system: Optional[str] = None,
+        temperature: float = 1.0,
+        stop_sequences: Optional[List[str]] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        thinking: bool = False,
+        thinking_budget: int = 1024,
+    ):
+        """
+        Send a chat request to the LLM without blocking the event loop.
+
+        Takes the same arguments and returns the same response as chat().
+        """
+        pass
+
+    async def astream(
+        self,
+        messages: List[Dict[str, Any]],
+        system: Optional[str] = None,
+        temperature: float = 1.0,
+        stop_sequences: Optional[List[str]] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        thinking: bool = False,
+        thinking_budget: int = 1024,
+    ) -> AsyncIterator[StreamEvent]:
+        """
+        Stream a chat response as StreamEvents.
+
+        Providers without native streaming fall back to achat() and emit
+        the whole response at once.
+        """
+        message = await self.achat(
+            messages,
+            system=system,
+            temperature=temperature,
+            stop_sequences=stop_sequences,
+            tools=tools,
+            thinking=thinking,
+            thinking_budget=thinking_budget,
+        )
+        for block in message.content:
+            if block.type == "text":
+                yield StreamEvent("text", text=block.text)
+            elif block.type == "tool_use":
+                yield StreamEvent("tool_use", block=block)
+        yield StreamEvent("message", message=message)
+
+    async def count_tokens(
+        self,
+        messages: List[Dict[str, Any]],
+        system: Optional[str] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+    ) -> int:
+        """
+        Count the input tokens a request would use.
+
+        Providers with a token counting API should override this; the
+        default is a local estimate.
+        """
+        return estimate_tokens(messages, system=system, tools=tools)
+
+    def usage_from_message(self, message) -> Usage:
+        """
+        Normalized usage of the call that produced message.
+
+        The default reads Anthropic-style message.usage; providers that
+        report usage differently should override this. Missing counts are 0.
+        """
+        usage = getattr(message, "usage", None)
+        if usage is None:
+            return Usage(requests=1)
+        return Usage(
+            input_tokens=getattr(usage, "input_tokens", None) or 0,
+            output_tokens=getattr(usage, "output_tokens", None) or 0,
+            cache_read_input_tokens=getattr(usage, "cache_read_input_tokens", None) or 0,
+            cache_creation_input_tokens=getattr(usage, "cache_creation_input_tokens", None) or 0,
+            requests=1,
+        )
+
+    def message_to_dict(self, message) -> Dict[str, Any]:
+        """
+        JSON-serializable form of a response, for caching it on disk.
+
+        The default handles Anthropic Message objects; providers with their
+        own message type override this and message_from_dict() together.
+        """
+        return message.model_dump(mode="json")
+
+    def message_from_dict(self, data: Dict[str, Any]):
+        """Rebuild a response from message_to_dict() output."""
+        from anthropic.types import Message
+
+        return Message.model_validate(data)
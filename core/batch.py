@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+from typing import Callable, Iterable, Iterator, TextIO
+
+from core.chat import Chat
+from core.tracing import tracer
+
+
+def read_queries(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Parse a JSONL stream of queries.
+
+    Each line is an object with a "query" and an optional "id", or just a
+    JSON string. Blank lines are skipped. Lines that cannot be parsed are
+    yielded with an "error" so they show up in the results instead of
+    aborting the batch.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            yield {"id": line_number, "error": f"Invalid JSON: {e}"}
+            continue
+        if isinstance(item, str):
+            item = {"query": item}
+        if not isinstance(item, dict) or not isinstance(item.get("query"), str):
+            yield {"id": line_number, "error": 'Expected an object with a "query" string'}
+            continue
+        item.setdefault("id", line_number)
+        yield item
+
+
+class BatchRunner:
+    """
+    Runs queries as independent conversations with a fixed number of workers.
+
+    make_chat builds a fresh Chat per query; chats made from the same
+    connected MCP clients share them (and their caches and call limits).
+    Each result is written to output as one JSON line as soon as its query
+    finishes, so results arrive in completion order; use "id" to match them
+    to queries.
+    """
+
+    def __init__(self, make_chat: Callable[[], Chat], workers: int = 4):
+        if workers < 1:
+            raise ValueError("A batch needs at least one worker")
+        self.make_chat = make_chat
+        self.workers = workers
+        self.completed = 0
+        self.failed = 0
+
+    async def _run_one(self, item: dict) -> dict:
+        result = {"id": item["id"], "query": item.get("query")}
+        if "error" in item:
+            result["error"] = item["error"]
+            return result
+
+        chat = self.make_chat()
+        start = time.perf_counter()
+        try:
+            with tracer.span("batch.query", query_id=str(item["id"])):
+                result["response"] = await chat.run(item["query"])
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        result["usage"] = chat.usage.session.to_dict()
+        return result
+
+    async def _worker(self, queue: asyncio.Queue, output: TextIO):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            result = await self._run_one(item)
+            if "error" in result:
+                self.failed += 1
+            self.completed += 1
+            output.write(json.dumps(result, default=str) + "\n")
+            output.flush()
+
+    async def run(self, queries: Iterable[dict], output: TextIO):
+        """Run every query, writing results to output as they complete."""
+        # Bounded, so a huge input file is read as workers free up
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        workers = [
+            asyncio.create_task(self._worker(queue, output))
+            for _ in range(self.workers)
+        ]
+        try:
+            # Reading stdin (or a slow file) blocks, so it runs in a thread
+            # to keep the event loop, and the workers on it, running
+            pending = iter(queries)
+            while (item := await asyncio.to_thread(next, pending, None)) is not None:
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
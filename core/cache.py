@@ -0,0 +1,111 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class _LoadCancelled(Exception):
+    """Tells coalesced waiters that the load they shared was cancelled."""
+
+
+class AsyncTTLCache:
+    """
+    In-memory LRU cache with a per-entry TTL and single-flight loading.
+
+    Concurrent get_or_load() calls for the same missing key share one
+    loader call. If the caller running that load is cancelled, one of the
+    others runs it again. Invalidating a key while its load is in flight
+    stops the (possibly stale) result from being stored.
+
+    A ttl of None keeps entries until they are evicted or invalidated. A
+    ttl of zero or less disables caching; concurrent loads are still
+    shared.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.ttl is not None and self.ttl <= 0:
+            return
+        expires_at = float("inf") if self.ttl is None else time.monotonic() + self.ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        for key in [k for k in self._entries if predicate(k)]:
+            del self._entries[key]
+        for key in [k for k in self._inflight if predicate(k)]:
+            del self._inflight[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._inflight.clear()
+
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        missing = object()
+        while True:
+            value = self.get(key, missing)
+            if value is not missing:
+                self.hits += 1
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except _LoadCancelled:
+                # Its caller was cancelled, not this one: load it here
+                continue
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.set_exception(_LoadCancelled())
+            else:
+                future.set_exception(e)
+            # The caller gets the error; waiters are optional
+            future.exception()
+            raise
+
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+            self.set(key, value)
+        future.set_result(value)
+        return value
@@ -1,14 +1,202 @@
-from core.base_llm import BaseLLM
+from __future__ import annotations
+
+import json
+import time
+from typing import TYPE_CHECKING, Callable, Optional
+
+from core.base_llm import BaseLLM, current_conversation, estimate_tokens
 from mcp_client import MCPClient
-from core.tools import ToolManager
-from anthropic.types import MessageParam
+from core.tools import ToolCatalog, ToolManager
+from core.tracing import tracer
+from core.usage import UsageBudget, UsageBudgetExceeded, UsageTracker
+
+if TYPE_CHECKING:
+    from anthropic.types import MessageParam
+
+STALE_TOOL_RESULT = "[Tool result removed to save context space]"
+SKIPPED_TOOL_RESULT = "Not run: the usage budget for this conversation is spent"
+
+SUMMARY_PROMPT = """
+Summarize the conversation below so it can replace the original messages.
+Keep facts, decisions, document names, open questions and anything the
+assistant committed to doing. Drop small talk and raw document text that
+was only quoted. Respond with the summary only.
+
+<conversation>
+{transcript}
+</conversation>
+"""
+
+
+def _block_field(block, key: str, default=None):
+    if isinstance(block, dict):
+        return block.get(key, default)
+    return getattr(block, key, default)
+
+
+def _is_tool_result_message(message: MessageParam) -> bool:
+    content = message["content"]
+    return (
+        message["role"] == "user"
+        and isinstance(content, list)
+        and bool(content)
+        and all(_block_field(b, "type") == "tool_result" for b in content)
+    )
+
+
+def _render_message(message: MessageParam) -> str:
+    content = message["content"]
+    if isinstance(content, str):
+        return f"{message['role']}: {content}"
+
+    parts = []
+    for block in content:
+        block_type = _block_field(block, "type")
+        if block_type == "text":
+            parts.append(_block_field(block, "text", ""))
+        elif block_type == "tool_use":
+            name = _block_field(block, "name")
+            tool_input = json.dumps(_block_field(block, "input", {}), default=str)
+            parts.append(f"[called {name} with {tool_input}]")
+        elif block_type == "tool_result":
+            parts.append(f"[tool result: {_block_field(block, 'content', '')}]")
+    return f"{message['role']}: " + "\n".join(parts)
 
 
 class Chat:
-    def __init__(self, claude_service: BaseLLM, clients: dict[str, MCPClient]):
+    def __init__(
+        self,
+        claude_service: BaseLLM,
+        clients: dict[str, MCPClient],
+        token_budget: Optional[int] = None,
+        keep_recent_turns: int = 2,
+        usage_budget: Optional[UsageBudget] = None,
+    ):
         self.claude_service: BaseLLM = claude_service
         self.clients: dict[str, MCPClient] = clients
         self.messages: list[MessageParam] = []
+        self.tool_catalog = ToolCatalog(clients)
+        # Seconds from the start of each run() to its first streamed text
+        # delta, or None when a turn produced no text.
+        self.turn_ttfts: list[Optional[float]] = []
+        # Maximum input tokens per request; older turns are compacted
+        # once it is exceeded. None disables compaction.
+        self.token_budget = token_budget
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.pinned_messages: list[MessageParam] = []
+        # Token and model time totals per turn and session, checked
+        # against the budget after every model call
+        self.usage = UsageTracker(usage_budget)
+
+    def pin_message(self, message: MessageParam):
+        """Keeps the turn containing this message verbatim during compaction."""
+        self.pinned_messages.append(message)
+
+    def _is_pinned(self, turn: list[MessageParam]) -> bool:
+        return any(
+            message is pinned
+            for message in turn
+            for pinned in self.pinned_messages
+        )
+
+    def _split_turns(self) -> list[list[MessageParam]]:
+        """Groups messages into turns, each starting at a user query.
+
+        Tool results never start a turn, so a tool_use and its matching
+        tool_result always land in the same turn.
+        """
+        turns: list[list[MessageParam]] = []
+        for message in self.messages:
+            starts_turn = message["role"] == "user" and (
+                not _is_tool_result_message(message)
+            )
+            if starts_turn or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _strip_tool_results(self, message: MessageParam) -> MessageParam:
+        if not _is_tool_result_message(message):
+            return message
+        return {
+            **message,
+            "content": [
+                {**block, "content": STALE_TOOL_RESULT}
+                if isinstance(block, dict)
+                else block
+                for block in message["content"]
+            ],
+        }
+
+    async def _within_budget(self, tools: list[dict]) -> bool:
+        # The local estimate is free; only ask the provider for an exact
+        # count once the estimate gets close to the budget.
+        if estimate_tokens(self.messages, tools=tools) < self.token_budget * 0.8:
+            return True
+        tokens = await self.claude_service.count_tokens(self.messages, tools=tools)
+        return tokens <= self.token_budget
+
+    async def _summarize(self, messages: list[MessageParam]) -> str:
+        transcript = "\n\n".join(_render_message(m) for m in messages)
+        response = await self.claude_service.achat(
+            messages=[
+                {
+                    "role": "user",
+                    "content": SUMMARY_PROMPT.format(transcript=transcript),
+                }
+            ],
+        )
+        self.usage.record(self.claude_service.usage_from_message(response))
+        return self.claude_service.text_from_message(response)
+
+    async def _fit_token_budget(self, tools: list[dict]):
+        """Compacts older turns when the next request would exceed the budget.
+
+        Stale tool results are dropped first; if that is not enough, every
+        unpinned older turn is replaced by a single summary message. The
+        most recent turns, including the one in progress, stay untouched.
+        """
+        if not self.token_budget or await self._within_budget(tools):
+            return
+
+        with tracer.span("chat.compact", messages_before=len(self.messages)) as span:
+            await self._compact(tools)
+            span.set_attribute("messages_after", len(self.messages))
+
+    async def _compact(self, tools: list[dict]):
+
+        turns = self._split_turns()
+        if len(turns) <= self.keep_recent_turns:
+            return
+
+        older = turns[: -self.keep_recent_turns]
+        recent = turns[-self.keep_recent_turns :]
+
+        older = [
+            turn
+            if self._is_pinned(turn)
+            else [self._strip_tool_results(m) for m in turn]
+            for turn in older
+        ]
+        self.messages = [m for turn in older + recent for m in turn]
+        if await self._within_budget(tools):
+            return
+
+        pinned = [turn for turn in older if self._is_pinned(turn)]
+        unpinned = [turn for turn in older if not self._is_pinned(turn)]
+        if not unpinned:
+            return
+
+        summary = await self._summarize([m for turn in unpinned for m in turn])
+        self.messages = [
+            {
+                "role": "user",
+                "content": (
+                    f"<conversation_summary>\n{summary}\n</conversation_summary>"
+                ),
+            },
+            *(m for turn in pinned + recent for m in turn),
+        ]
 
     async def _process_query(self, query: str):
         self.messages.append({"role": "user", "content": query})
@@ -16,26 +204,104 @@ class Chat:
     async def run(
         self,
         query: str,
+        on_text: Optional[Callable[[str], None]] = None,
     ) -> str:
-        final_text_response = ""
+        """Runs one user turn through the agent loop.
 
-        await self._process_query(query)
+        Text deltas are passed to on_text as the model streams them, while
+        tool_use blocks are collected and executed between model calls.
+        Without on_text, only the final answer is returned; nothing is
+        printed.
+        """
+        self.usage.start_turn()
+        try:
+            # Only session limits can already be reached here
+            self.usage.check_budget()
+        except UsageBudgetExceeded as e:
+            return f"Not sent: {e}."
 
-        tools = await ToolManager.get_all_tools(self.clients)
+        try:
+            with tracer.span("chat.turn") as turn_span:
+                final_text_response = await self._run_turn(query, on_text, turn_span)
+        finally:
+            self.usage.end_turn()
+        return final_text_response
+
+    def _skip_tool_requests(self, response) -> list[dict]:
+        """Error results for tool requests the budget stopped us from running.
+
+        Every tool_use still needs a matching tool_result, or the next
+        request with this history would be rejected.
+        """
+        return [
+            {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                "content": SKIPPED_TOOL_RESULT,
+                "is_error": True,
+            }
+            for block in response.content
+            if block.type == "tool_use"
+        ]
+
+    async def _run_turn(self, query, on_text, turn_span) -> str:
+        turn_start = time.perf_counter()
+        ttft: Optional[float] = None
+
+        with tracer.span("chat.process_query"):
+            await self._process_query(query)
 
+        with tracer.span("tools.get_tools"):
+            tools = await self.tool_catalog.get_tools()
+
+        model_calls = 0
         while True:
-            response = self.claude_service.chat(
-                messages=self.messages,
-                tools=tools,
-            )
+            await self._fit_token_budget(tools)
+
+            response = None
+            model_calls += 1
+            with tracer.span("llm.turn", model=self.claude_service.model) as llm_span:
+                conversation = current_conversation.set(self)
+                try:
+                    async for event in self.claude_service.astream(
+                        messages=self.messages,
+                        tools=tools,
+                    ):
+                        if event.type == "text":
+                            if ttft is None:
+                                ttft = time.perf_counter() - turn_start
+                                llm_span.set_attribute("ttft_ms", round(ttft * 1000, 3))
+                            if on_text:
+                                on_text(event.text)
+                        elif event.type == "message":
+                            response = event.message
+                finally:
+                    current_conversation.reset(conversation)
+                llm_span.set_attribute("stop_reason", response.stop_reason)
+
+                usage = self.claude_service.usage_from_message(response)
+                if not usage.model_seconds:
+                    usage.model_seconds = llm_span.elapsed()
+                self.usage.record(usage)
 
             self.claude_service.add_assistant_message(self.messages, response)
 
             if response.stop_reason == "tool_use":
-                print("texting")
-                print(self.claude_service.text_from_message(response))
+                try:
+                    self.usage.check_budget()
+                except UsageBudgetExceeded as e:
+                    self.claude_service.add_user_message(
+                        self.messages, self._skip_tool_requests(response)
+                    )
+                    final_text_response = f"Stopped before running more tools: {e}."
+                    if on_text:
+                        on_text(final_text_response)
+                    break
+
+                if on_text and self.claude_service.text_from_message(response):
+                    on_text("\n")
                 tool_result_parts = await ToolManager.execute_tool_requests(
-                    self.clients, response
+                    self.tool_catalog, response
                 )
 
                 self.claude_service.add_user_message(
@@ -47,4 +313,10 @@ class Chat:
                 )
                 break
 
+        turn_span.set_attributes({
+            "model_calls": model_calls,
+            "messages": len(self.messages),
+            **self.usage.turn.to_dict(),
+        })
+        self.turn_ttfts.append(ttft)
         return final_text_response
@@ -1,12 +1,83 @@
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 from anthropic.types import Message
-from core.base_llm import BaseLLM
+from core.base_llm import BaseLLM, StreamEvent, estimate_tokens
+from core.tracing import tracer
+
+
+CACHE_CONTROL = {"type": "ephemeral"}
 
 
 class Claude(BaseLLM):
-    def __init__(self, model: str):
+    def __init__(self, model: str, prompt_caching: bool = True):
         super().__init__(model)
         self.client = Anthropic()
+        self.async_client = AsyncAnthropic()
+        self.prompt_caching = prompt_caching
+
+    async def validate(self):
+        try:
+            await self.async_client.models.retrieve(self.model)
+        except Exception as e:
+            print(f"Warning: could not verify Claude model '{self.model}': {e}")
+
+    def _record_usage(self, message: Message, span=None):
+        if span is not None:
+            span.set_attributes({
+                "input_tokens": message.usage.input_tokens,
+                "output_tokens": message.usage.output_tokens,
+                "cache_read_input_tokens": getattr(message.usage, "cache_read_input_tokens", None) or 0,
+                "cache_creation_input_tokens": getattr(message.usage, "cache_creation_input_tokens", None) or 0,
+                "stop_reason": message.stop_reason,
+            })
+
+    def _with_cache_breakpoints(self, params: dict) -> dict:
+        """
+        Mark the stable prompt prefix as cacheable.
+
+        Breakpoints go on the last tool definition, the system prompt and
+        the last block of the final message, so each agent-loop iteration
+        reads everything up to its new messages from the cache. The caller's
+        lists are copied, never mutated.
+        """
+        if params.get("tools"):
+            tools = list(params["tools"])
+            tools[-1] = {**tools[-1], "cache_control": CACHE_CONTROL}
+            params["tools"] = tools
+
+        if params.get("system"):
+            system = params["system"]
+            if isinstance(system, str):
+                system = [{"type": "text", "text": system}]
+            system = list(system)
+            system[-1] = {**system[-1], "cache_control": CACHE_CONTROL}
+            params["system"] = system
+
+        messages = params["messages"]
+        if messages:
+            last = messages[-1]
+            content = last["content"]
+            if isinstance(content, str) and content:
+                content = [
+                    {
+                        "type": "text",
+                        "text": content,
+                        "cache_control": CACHE_CONTROL,
+                    }
+                ]
+            elif (
+                isinstance(content, list)
+                and content
+                and isinstance(content[-1], dict)
+            ):
+                content = [
+                    *content[:-1],
+                    {**content[-1], "cache_control": CACHE_CONTROL},
+                ]
+            else:
+                return params
+            params["messages"] = [*messages[:-1], {**last, "content": content}]
+
+        return params
 
     def add_user_message(self, messages: list, message):
         user_message = {
@@ -31,7 +102,7 @@ class Claude(BaseLLM):
             [block.text for block in message.content if block.type == "text"]
         )
 
-    def chat(
+    def _build_params(
         self,
         messages,
         system=None,
@@ -40,7 +111,7 @@ class Claude(BaseLLM):
         tools=None,
         thinking=False,
         thinking_budget=1024,
-    ) -> Message:
+    ) -> dict:
         if stop_sequences is None:
             stop_sequences = []
 
@@ -64,5 +135,111 @@ class Claude(BaseLLM):
         if system:
             params["system"] = system
 
-        message = self.client.messages.create(**params)
+        if self.prompt_caching:
+            params = self._with_cache_breakpoints(params)
+
+        return params
+
+    async def count_tokens(self, messages, system=None, tools=None) -> int:
+        params = {"model": self.model, "messages": messages}
+        if system:
+            params["system"] = system
+        if tools:
+            params["tools"] = tools
+        try:
+            with tracer.span("claude.count_tokens", model=self.model):
+                result = await self.async_client.messages.count_tokens(**params)
+            return result.input_tokens
+        except Exception as e:
+            print(f"Warning: token counting failed, using an estimate: {e}")
+            return estimate_tokens(messages, system=system, tools=tools)
+
+    def chat(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ) -> Message:
+        params = self._build_params(
+            messages,
+            system=system,
+            temperature=temperature,
+            stop_sequences=stop_sequences,
+            tools=tools,
+            thinking=thinking,
+            thinking_budget=thinking_budget,
+        )
+        with tracer.span("claude.messages.create", model=self.model) as span:
+            message = self.client.messages.create(**params)
+            self._record_usage(message, span)
+        return message
+
+    async def achat(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ) -> Message:
+        params = self._build_params(
+            messages,
+            system=system,
+            temperature=temperature,
+            stop_sequences=stop_sequences,
+            tools=tools,
+            thinking=thinking,
+            thinking_budget=thinking_budget,
+        )
+        with tracer.span("claude.messages.create", model=self.model) as span:
+            message = await self.async_client.messages.create(**params)
+            self._record_usage(message, span)
         return message
+
+    async def astream(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ):
+        params = self._build_params(
+            messages,
+            system=system,
+            temperature=temperature,
+            stop_sequences=stop_sequences,
+            tools=tools,
+            thinking=thinking,
+            thinking_budget=thinking_budget,
+        )
+        # Not a with-block: the caller runs between yields and must not
+        # end up inside this span
+        span = tracer.start_span("claude.messages.stream", model=self.model)
+        try:
+            async with self.async_client.messages.stream(**params) as stream:
+                async for event in stream:
+                    if event.type == "text":
+                        if "ttft_ms" not in span.attributes:
+                            span.set_attribute("ttft_ms", round(span.elapsed() * 1000, 3))
+                        yield StreamEvent("text", text=event.text)
+                    elif (
+                        event.type == "content_block_stop"
+                        and event.content_block.type == "tool_use"
+                    ):
+                        yield StreamEvent("tool_use", block=event.content_block)
+                message = await stream.get_final_message()
+        except BaseException as e:
+            tracer.end_span(span, error=e)
+            raise
+        self._record_usage(message, span)
+        tracer.end_span(span)
+        yield StreamEvent("message", message=message)
@@ -7,8 +7,11 @@ from prompt_toolkit.history import InMemoryHistory
 from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
 from prompt_toolkit.document import Document
 from prompt_toolkit.buffer import Buffer
+from prompt_toolkit.patch_stdout import patch_stdout
 
 from core.cli_chat import CliChat
+from core.fanout import FanOut, parse_fanout_command
+from core.tracing import tracer
 
 
 class CommandAutoSuggest(AutoSuggest):
@@ -111,8 +114,10 @@ class UnifiedCompleter(Completer):
 
 
 class CliApp:
-    def __init__(self, agent: CliChat):
+    def __init__(self, agent: CliChat, fanout: Optional[FanOut] = None):
         self.agent = agent
+        # Runs commands like "/summarize @*" across many documents
+        self.fanout = fanout
         self.resources = []
         self.prompts = []
 
@@ -196,15 +201,87 @@ class CliApp:
         except Exception as e:
             print(f"Error refreshing prompts: {e}")
 
+    def print_stats(self):
+        """Print latency percentiles per traced phase for this session."""
+        stats = tracer.stats()
+        if not stats:
+            print("No activity recorded yet.")
+            return
+
+        print(
+            f"{'Phase':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}"
+            f"{'p99 ms':>10}{'max ms':>10}{'total ms':>11}"
+        )
+        for name, phase in sorted(
+            stats.items(), key=lambda item: item[1]["total_ms"], reverse=True
+        ):
+            print(
+                f"{name:<28}{phase['count']:>7}{phase['p50_ms']:>10.1f}"
+                f"{phase['p95_ms']:>10.1f}{phase['p99_ms']:>10.1f}"
+                f"{phase['max_ms']:>10.1f}{phase['total_ms']:>11.1f}"
+            )
+
+    def print_usage(self):
+        """Print token usage of the last turn and of the whole session."""
+        usage = self.agent.usage
+        rows = [("Session", usage.session)]
+        if usage.turns:
+            rows.insert(0, ("Last turn", usage.turns[-1]))
+        print(
+            f"{'':<12}{'calls':>7}{'input':>10}{'output':>10}"
+            f"{'cache rd':>10}{'cache wr':>10}{'hit %':>7}{'model s':>9}{'cost':>10}"
+        )
+        for label, totals in rows:
+            cost = totals.cost(usage.budget.prices)
+            print(
+                f"{label:<12}{totals.requests:>7}{totals.input_tokens:>10}"
+                f"{totals.output_tokens:>10}{totals.cache_read_input_tokens:>10}"
+                f"{totals.cache_creation_input_tokens:>10}"
+                f"{totals.cache_hit_rate * 100:>6.0f}%{totals.model_seconds:>9.1f}"
+                f"{'-' if cost is None else f'${cost:.4f}':>10}"
+            )
+
     async def run(self):
         while True:
             try:
-                user_input = await self.session.prompt_async("> ")
+                # Background output, e.g. a model validation warning,
+                # is printed above the prompt instead of through it
+                with patch_stdout(raw=True):
+                    user_input = await self.session.prompt_async("> ")
                 if not user_input.strip():
                     continue
 
-                response = await self.agent.run(user_input)
-                print(f"\nResponse:\n{response}")
+                if user_input.strip() == "/stats":
+                    self.print_stats()
+                    continue
+
+                if user_input.strip() == "/usage":
+                    self.print_usage()
+                    continue
+
+                fanout_command = parse_fanout_command(user_input)
+                if fanout_command and self.fanout:
+                    command, pattern, reduce = fanout_command
+                    doc_ids = await self.agent.list_docs_ids()
+                    response = await self.fanout.run(
+                        command, pattern, doc_ids, reduce=reduce
+                    )
+                    print(f"\nResponse:\n{response}")
+                    continue
+
+                print("\nResponse:")
+                streamed = False
+
+                def render(delta: str):
+                    nonlocal streamed
+                    streamed = True
+                    print(delta, end="", flush=True)
+
+                response = await self.agent.run(user_input, on_text=render)
+                if streamed:
+                    print()
+                else:
+                    print(response)
 
             except KeyboardInterrupt:
                 break
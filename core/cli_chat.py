@@ -1,11 +1,19 @@
-from typing import List, Tuple
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, List, Optional, Tuple
 from mcp.types import Prompt, PromptMessage
-from anthropic.types import MessageParam
 
 from core.chat import Chat
 from core.base_llm import BaseLLM
+from core.retrieval import DocumentIndexer, list_document_ids, select_within_budget
+from core.tracing import tracer
+from core.usage import UsageBudget
 from mcp_client import MCPClient
 
+if TYPE_CHECKING:
+    from anthropic.types import MessageParam
+
 
 class CliChat(Chat):
     def __init__(
@@ -13,16 +21,31 @@ class CliChat(Chat):
         doc_client: MCPClient,
         clients: dict[str, MCPClient],
         claude_service: BaseLLM,
+        token_budget: Optional[int] = None,
+        retrieval_indexer: Optional[DocumentIndexer] = None,
+        retrieval_top_k: int = 5,
+        retrieval_token_budget: int = 1500,
+        usage_budget: Optional[UsageBudget] = None,
     ):
-        super().__init__(clients=clients, claude_service=claude_service)
+        super().__init__(
+            clients=clients,
+            claude_service=claude_service,
+            token_budget=token_budget,
+            usage_budget=usage_budget,
+        )
 
         self.doc_client: MCPClient = doc_client
+        # When set, each query also gets the document chunks most similar
+        # to it, up to retrieval_token_budget tokens
+        self.retrieval_indexer = retrieval_indexer
+        self.retrieval_top_k = retrieval_top_k
+        self.retrieval_token_budget = retrieval_token_budget
 
     async def list_prompts(self) -> list[Prompt]:
         return await self.doc_client.list_prompts()
 
     async def list_docs_ids(self) -> list[str]:
-        return await self.doc_client.read_resource("docs:://documents")
+        return await list_document_ids(self.doc_client)
 
     async def get_doc_content(self, doc_id: str) -> str:
         return await self.doc_client.read_resource(f"docs:://documents/{doc_id}")
@@ -34,20 +57,52 @@ class CliChat(Chat):
 
     async def _extract_resources(self, query: str) -> str:
         mentions = [word[1:] for word in query.split() if word.startswith("@")]
-
-        doc_ids = await self.list_docs_ids()
-        mentioned_docs: list[Tuple[str, str]] = []
-
-        for doc_id in doc_ids:
-            if doc_id in mentions:
-                content = await self.get_doc_content(doc_id)
-                mentioned_docs.append((doc_id, content))
+        if not mentions:
+            return ""
+
+        with tracer.span("chat.extract_resources", mentions=len(mentions)):
+            return await self._fetch_mentioned_docs(mentions)
+
+    async def _fetch_mentioned_docs(self, mentions: list[str]) -> str:
+        doc_ids = set(await self.list_docs_ids())
+        mentioned_ids = [
+            doc_id for doc_id in dict.fromkeys(mentions) if doc_id in doc_ids
+        ]
+        contents = await asyncio.gather(
+            *(self.get_doc_content(doc_id) for doc_id in mentioned_ids)
+        )
+        mentioned_docs: list[Tuple[str, str]] = list(zip(mentioned_ids, contents))
 
         return "".join(
             f'\n<document id="{doc_id}">\n{content}\n</document>\n'
             for doc_id, content in mentioned_docs
         )
 
+    async def _retrieve_chunks(self, query: str) -> str:
+        """Return the chunks most relevant to query, skipping @-mentioned docs."""
+        if self.retrieval_indexer is None:
+            return ""
+
+        with tracer.span("chat.retrieve") as span:
+            context = await self._search_chunks(query)
+            span.set_attribute("context_chars", len(context))
+            return context
+
+    async def _search_chunks(self, query: str) -> str:
+        # Reads only documents that changed since the last query
+        await self.retrieval_indexer.refresh()
+
+        mentioned = {word[1:] for word in query.split() if word.startswith("@")}
+        matches = self.retrieval_indexer.index.search(
+            query, top_k=self.retrieval_top_k, exclude=mentioned
+        )
+        return "".join(
+            f'\n<document_excerpt id="{doc_id}">\n{chunk}\n</document_excerpt>\n'
+            for doc_id, chunk, _ in select_within_budget(
+                matches, self.retrieval_token_budget
+            )
+        )
+
     async def _process_command(self, query: str) -> bool:
         if not query.startswith("/"):
             return False
@@ -59,14 +114,22 @@ class CliChat(Chat):
             command, {"doc_id": words[1]}
         )
 
-        self.messages += convert_prompt_messages_to_message_params(messages)
+        prompt_messages = convert_prompt_messages_to_message_params(messages)
+        # Command prompts carry the task instructions, so keep them
+        # verbatim when older turns are compacted
+        for message in prompt_messages:
+            self.pin_message(message)
+        self.messages += prompt_messages
         return True
 
     async def _process_query(self, query: str):
         if await self._process_command(query):
             return
 
-        added_resources = await self._extract_resources(query)
+        added_resources, retrieved_chunks = await asyncio.gather(
+            self._extract_resources(query), self._retrieve_chunks(query)
+        )
+        added_resources += retrieved_chunks
 
         prompt = f"""
         The user has a question:
@@ -82,6 +145,7 @@ class CliChat(Chat):
         Note the user's query might contain references to documents like "@report.docx". The "@" is only
         included as a way of mentioning the doc. The actual name of the document would be "report.docx".
         If the document content is included in this prompt, you don't need to use an additional tool to read the document.
+        A document_excerpt is only part of a document; read the document with a tool if you need more of it.
         Answer the user's question directly and concisely. Start with the exact information they need. 
         Don't refer to or mention the provided context in any way - just use it to inform your answer.
         """
@@ -0,0 +1,253 @@
+import asyncio
+import fnmatch
+import hashlib
+import json
+import os
+import time
+from typing import Callable, Optional
+
+from core.base_llm import BaseLLM
+from core.chat import Chat
+from core.tracing import tracer
+from core.usage import Usage
+
+GLOB_CHARS = "*?["
+
+REDUCE_PROMPT = """
+Below are the results of the "{command}" task, run separately on each of
+several documents. Merge them into a single answer that covers every
+document. Keep what is specific to each document where it matters, and
+combine what they have in common. Respond with the merged result only.
+
+<results>
+{results}
+</results>
+"""
+
+
+def parse_fanout_command(query: str) -> Optional[tuple[str, str, bool]]:
+    """
+    Recognize "/command @pattern [--reduce]", where pattern is a glob.
+
+    Returns (command, pattern, reduce), or None for anything else,
+    including ordinary single-document commands.
+    """
+    words = query.split()
+    if len(words) < 2 or not words[0].startswith("/"):
+        return None
+    pattern = words[1].removeprefix("@")
+    if not any(char in pattern for char in GLOB_CHARS):
+        return None
+    return words[0][1:], pattern, "--reduce" in words[2:]
+
+
+class RateLimiter:
+    """Spaces out starts to at most rate per second; 0 means no limit."""
+
+    def __init__(self, rate: float = 0.0):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class FanOut:
+    """
+    Applies a prompt command to many documents, then optionally merges
+    the results.
+
+    Map: every matching document gets its own conversation from make_chat
+    running "/command doc_id", with at most workers in flight and starts
+    limited to rate per second. Each finished document is appended to a
+    checkpoint file, so rerunning the same command after an interruption
+    skips the documents already done. The checkpoint is deleted once the
+    whole run succeeds.
+
+    Reduce: outputs are merged by the model in groups that fit
+    reduce_token_budget, and the merged groups again, until one remains.
+    """
+
+    def __init__(
+        self,
+        make_chat: Callable[[], Chat],
+        llm: BaseLLM,
+        workers: int = 4,
+        rate: float = 0.0,
+        checkpoint_dir: str = ".fanout",
+        reduce_token_budget: int = 50_000,
+        report: Callable[[str], None] = print,
+    ):
+        if workers < 1:
+            raise ValueError("A fan-out needs at least one worker")
+        self.make_chat = make_chat
+        self.llm = llm
+        self.workers = workers
+        self.rate_limiter = RateLimiter(rate)
+        self.checkpoint_dir = checkpoint_dir
+        self.reduce_token_budget = reduce_token_budget
+        self.report = report
+        # Tokens and model time of every map and reduce call
+        self.usage = Usage()
+        self._slots = asyncio.Semaphore(workers)
+
+    def checkpoint_path(self, command: str, pattern: str) -> str:
+        digest = hashlib.sha256(f"{command}\0{pattern}".encode()).hexdigest()[:12]
+        return os.path.join(self.checkpoint_dir, f"{command}-{digest}.jsonl")
+
+    @staticmethod
+    def _load_checkpoint(path: str) -> dict[str, str]:
+        done = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by the interruption; redo that doc
+                        continue
+                    done[entry["doc_id"]] = entry["output"]
+        except FileNotFoundError:
+            pass
+        return done
+
+    async def _map_one(self, command: str, doc_id: str) -> str:
+        async with self._slots:
+            await self.rate_limiter.wait()
+            chat = self.make_chat()
+            try:
+                with tracer.span("fanout.map", command=command, doc_id=doc_id):
+                    return await chat.run(f"/{command} {doc_id}")
+            finally:
+                self.usage.add(chat.usage.session)
+
+    async def map(
+        self, command: str, doc_ids: list[str], checkpoint_path: str
+    ) -> tuple[dict[str, str], dict[str, str]]:
+        """Run command on every document. Returns (outputs, errors) by doc_id."""
+        outputs = self._load_checkpoint(checkpoint_path)
+        outputs = {d: outputs[d] for d in doc_ids if d in outputs}
+        pending = [d for d in doc_ids if d not in outputs]
+        if outputs:
+            self.report(f"Resuming: {len(outputs)} of {len(doc_ids)} documents already done.")
+
+        errors: dict[str, str] = {}
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+        with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+
+            async def run(doc_id: str):
+                try:
+                    output = await self._map_one(command, doc_id)
+                except Exception as e:
+                    errors[doc_id] = f"{type(e).__name__}: {e}"
+                    self.report(f"  ✗ {doc_id}: {errors[doc_id]}")
+                    return
+                outputs[doc_id] = output
+                checkpoint.write(json.dumps({"doc_id": doc_id, "output": output}) + "\n")
+                checkpoint.flush()
+
+                finished = len(outputs) + len(errors)
+                elapsed = time.perf_counter() - start
+                done_here = finished - (len(doc_ids) - len(pending))
+                throughput = done_here / elapsed if elapsed else 0.0
+                remaining = len(doc_ids) - finished
+                eta = remaining / throughput if throughput else 0.0
+                self.report(
+                    f"  [{finished}/{len(doc_ids)}] {doc_id} "
+                    f"({throughput:.2f} docs/s, ~{eta:.0f}s left)"
+                )
+
+            await asyncio.gather(*(run(doc_id) for doc_id in pending))
+
+        elapsed = time.perf_counter() - start
+        self.report(
+            f"Mapped {len(pending) - len(errors)} documents in {elapsed:.1f}s "
+            f"({(len(pending) - len(errors)) / elapsed if elapsed else 0:.2f} docs/s), "
+            f"{len(doc_ids) - len(pending)} from checkpoint, {len(errors)} failed."
+        )
+        return outputs, errors
+
+    async def _merge(self, command: str, parts: list[tuple[str, str]]) -> str:
+        results = "\n".join(
+            f'<result id="{part_id}">\n{output}\n</result>' for part_id, output in parts
+        )
+        async with self._slots:
+            await self.rate_limiter.wait()
+            with tracer.span("fanout.reduce", command=command, parts=len(parts)):
+                response = await self.llm.achat(
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": REDUCE_PROMPT.format(command=command, results=results),
+                        }
+                    ],
+                )
+        self.usage.add(self.llm.usage_from_message(response))
+        return self.llm.text_from_message(response)
+
+    def _group(self, parts: list[tuple[str, str]]) -> list[list[tuple[str, str]]]:
+        # ~4 characters per token, as in estimate_tokens
+        budget_chars = self.reduce_token_budget * 4
+        groups: list[list[tuple[str, str]]] = [[]]
+        size = 0
+        for part in parts:
+            # At least two parts per group, so every round shrinks the list
+            if len(groups[-1]) >= 2 and size + len(part[1]) > budget_chars:
+                groups.append([])
+                size = 0
+            groups[-1].append(part)
+            size += len(part[1])
+        return groups
+
+    async def reduce(self, command: str, outputs: dict[str, str]) -> str:
+        parts = list(outputs.items())
+        round_number = 0
+        while True:
+            groups = self._group(parts)
+            if len(groups) == 1:
+                return await self._merge(command, groups[0])
+            round_number += 1
+            self.report(f"Reducing {len(parts)} results in {len(groups)} groups...")
+            merged = await asyncio.gather(
+                *(self._merge(command, group) for group in groups)
+            )
+            parts = [
+                (f"part-{round_number}-{i}", text) for i, text in enumerate(merged)
+            ]
+
+    async def run(
+        self,
+        command: str,
+        pattern: str,
+        doc_ids: list[str],
+        reduce: bool = False,
+    ) -> str:
+        matched = [d for d in doc_ids if fnmatch.fnmatchcase(d, pattern)]
+        if not matched:
+            return f"No documents match '{pattern}'."
+        self.report(f"Running /{command} on {len(matched)} documents with {self.workers} workers...")
+
+        checkpoint_path = self.checkpoint_path(command, pattern)
+        outputs, errors = await self.map(command, matched, checkpoint_path)
+        if errors:
+            return (
+                f"Failed on {len(errors)} of {len(matched)} documents: "
+                f"{', '.join(errors)}. Run the same command again to retry them; "
+                f"finished documents are kept in {checkpoint_path}."
+            )
+
+        if reduce:
+            answer = await self.reduce(command, outputs)
+        else:
+            answer = "\n\n".join(f"## {doc_id}\n\n{outputs[doc_id]}" for doc_id in matched)
+        os.remove(checkpoint_path)
+        return answer
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import time
+import weakref
+from typing import Any, Dict, List, Optional
+
+from core.base_llm import BaseLLM, StreamEvent, _jsonable
+from core.tracing import tracer
+from core.usage import Usage
+
+CACHE_MODES = ("off", "read_write", "record", "replay")
+# Bump when the key or entry format changes, so old entries stop matching
+CACHE_FORMAT = 1
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+class CachedLLM(BaseLLM):
+    """
+    Content-addressed disk cache in front of any BaseLLM.
+
+    A request's key is the SHA-256 of its model, messages, tools, system
+    prompt, temperature, stop sequences and thinking settings. Responses
+    are stored one JSON file per key under cache_dir, serialized with the
+    wrapped provider's message_to_dict(). Least recently used entries are
+    evicted once the directory grows past max_bytes.
+
+    Modes:
+        off         always call the model
+        read_write  serve hits from disk, call the model and store misses
+        record      always call the model and overwrite the stored response
+        replay      serve hits only; a miss raises CacheMiss, so a run
+                    never reaches the network
+
+    Cached responses report zero usage: they cost nothing to serve.
+    """
+
+    def __init__(
+        self,
+        llm: BaseLLM,
+        cache_dir: str = ".llm_cache",
+        mode: str = "read_write",
+        max_bytes: int = 200 * 1024 * 1024,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(
+                f"Invalid cache mode: {mode}. Use one of {', '.join(CACHE_MODES)}"
+            )
+        super().__init__(llm.model)
+        self.llm = llm
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Responses served from disk, to report their usage as zero
+        self._served: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    async def validate(self):
+        # Replay never calls the model, so it need not be reachable
+        if self.mode != "replay":
+            await self.llm.validate()
+
+    def add_user_message(self, messages: list, message):
+        self.llm.add_user_message(messages, message)
+
+    def add_assistant_message(self, messages: list, message):
+        self.llm.add_assistant_message(messages, message)
+
+    def text_from_message(self, message) -> str:
+        return self.llm.text_from_message(message)
+
+    def message_to_dict(self, message) -> Dict[str, Any]:
+        return self.llm.message_to_dict(message)
+
+    def message_from_dict(self, data: Dict[str, Any]):
+        return self.llm.message_from_dict(data)
+
+    async def count_tokens(self, messages, system=None, tools=None) -> int:
+        return await self.llm.count_tokens(messages, system=system, tools=tools)
+
+    def usage_from_message(self, message) -> Usage:
+        if self._served.get(id(message)) is message:
+            return Usage()
+        return self.llm.usage_from_message(message)
+
+    def request_key(
+        self,
+        messages: List[Dict[str, Any]],
+        system: Optional[str] = None,
+        temperature: float = 1.0,
+        stop_sequences: Optional[List[str]] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        thinking: bool = False,
+        thinking_budget: int = 1024,
+    ) -> str:
+        request = {
+            "format": CACHE_FORMAT,
+            "model": self.model,
+            "messages": messages,
+            "system": system,
+            "temperature": temperature,
+            "stop_sequences": stop_sequences or [],
+            "tools": tools or [],
+            "thinking": thinking_budget if thinking else None,
+        }
+        # sort_keys and fixed separators make the encoding canonical
+        payload = json.dumps(
+            request, sort_keys=True, separators=(",", ":"), default=_jsonable
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _entries(self):
+        """(path, size, last used) of every stored entry."""
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def _load(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable cache entry {path}: {e}")
+            return None
+        # The modification time doubles as the last-use time for eviction
+        os.utime(path)
+        message = self.message_from_dict(data["message"])
+        self._served[id(message)] = message
+        return message
+
+    def _store(self, key: str, message):
+        if self.mode == "off" or getattr(message, "is_error", False):
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        data = {
+            "model": self.model,
+            "created": time.time(),
+            "message": self.message_to_dict(message),
+        }
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=_jsonable)
+        # Readers never see a partly written entry
+        os.replace(temp_path, path)
+        self._size += os.path.getsize(path) - previous
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until under max_bytes."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def _lookup(self, key: str):
+        """The cached response for key, or None when the model must be called."""
+        if self.mode in ("off", "record"):
+            return None
+        message = self._load(key)
+        if message is not None:
+            self.hits += 1
+            return message
+        self.misses += 1
+        if self.mode == "replay":
+            raise CacheMiss(
+                f"No recorded response for request {key[:12]} in {self.cache_dir}"
+            )
+        return None
+
+    def chat(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ):
+        params = dict(
+            system=system,
+            temperature=temperature,
+            stop_sequences=stop_sequences,
+            tools=tools,
+            thinking=thinking,
+            thinking_budget=thinking_budget,
+        )
+        key = self.request_key(messages, **params)
+        message = self._lookup(key)
+        if message is None:
+            message = self.llm.chat(messages, **params)
+            self._store(key, message)
+        return message
+
+    async def achat(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ):
+        params = dict(
+            system=system,
+            temperature=temperature,
+            stop_sequences=stop_sequences,
+            tools=tools,
+            thinking=thinking,
+            thinking_budget=thinking_budget,
+        )
+        key = self.request_key(messages, **params)
+        with tracer.span("llm_cache.lookup", mode=self.mode) as span:
+            message = self._lookup(key)
+            span.set_attribute("hit", message is not None)
+        if message is None:
+            message = await self.llm.achat(messages, **params)
+            self._store(key, message)
+        return message
+
+    async def astream(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ):
+        params = dict(
+            system=system,
+            temperature=temperature,
+            stop_sequences=stop_sequences,
+            tools=tools,
+            thinking=thinking,
+            thinking_budget=thinking_budget,
+        )
+        key = self.request_key(messages, **params)
+        with tracer.span("llm_cache.lookup", mode=self.mode) as span:
+            message = self._lookup(key)
+            span.set_attribute("hit", message is not None)
+        if message is not None:
+            for block in message.content:
+                if block.type == "text":
+                    yield StreamEvent("text", text=block.text)
+                elif block.type == "tool_use":
+                    yield StreamEvent("tool_use", block=block)
+            yield StreamEvent("message", message=message)
+            return
+
+        async for event in self.llm.astream(messages, **params):
+            if event.type == "message":
+                self._store(key, event.message)
+            yield event
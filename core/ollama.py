@@ -1,7 +1,9 @@
 import ollama
-from anthropic.types import Message
-from typing import List, Dict, Any
-from core.base_llm import BaseLLM
+import weakref
+from typing import List, Dict, Any, Optional
+from core.base_llm import BaseLLM, StreamEvent, current_conversation
+from core.tracing import tracer
+from core.usage import Usage
 
 
 class OllamaMessage:
@@ -12,24 +14,33 @@ class OllamaMessage:
         self.role = role
         self.model = model
         self.stop_reason = "end_turn"
+        self.usage: Optional[Usage] = None
+        # Set on the placeholder returned when the request failed
+        self.is_error = False
 
 
 class Ollama(BaseLLM):
     def __init__(self, model: str = "llama3.2"):
         super().__init__(model)
         self.client = ollama.Client()
+        self.async_client = ollama.AsyncClient()
+        # Per conversation: source messages from its last conversion and
+        # their Ollama form. Dropped when the conversation is.
+        self._conversions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
 
+    async def validate(self):
         try:
-            self.client.show(model)
+            await self.async_client.show(self.model)
         except Exception as e:
-            print(f"Warning: Model '{model}' not found. You may need to run: ollama pull {model}")
+            print(f"Warning: Model '{self.model}' not found. You may need to run: ollama pull {self.model}")
             print(f"Error: {e}")
 
     def add_user_message(self, messages: list, message):
         user_message = {
             "role": "user",
+            # OllamaMessage, or a Message from another provider
             "content": message.content
-            if isinstance(message, (Message, OllamaMessage))
+            if hasattr(message, "content")
             else message,
         }
         messages.append(user_message)
@@ -38,7 +49,7 @@ class Ollama(BaseLLM):
         assistant_message = {
             "role": "assistant",
             "content": message.content
-            if isinstance(message, (Message, OllamaMessage))
+            if hasattr(message, "content")
             else message,
         }
         messages.append(assistant_message)
@@ -48,25 +59,14 @@ class Ollama(BaseLLM):
             [block.text for block in message.content if hasattr(block, 'text')]
         )
 
-    def chat(
+    def _build_request(
         self,
         messages,
         system=None,
         temperature=1.0,
-        stop_sequences=None,
         tools=None,
-        thinking=False,
-        thinking_budget=1024,
-    ) -> OllamaMessage:
-        """
-        Chat with Ollama, mimicking Claude's interface.
-
-        Note: Ollama doesn't support all features like thinking or tools in the same way.
-        This adapter focuses on basic chat functionality.
-        """
-        if stop_sequences is None:
-            stop_sequences = []
-
+    ) -> Dict[str, Any]:
+        """Build the keyword arguments for an Ollama chat request."""
         ollama_messages = self._convert_messages(messages)
 
         if system:
@@ -88,101 +88,303 @@ class Ollama(BaseLLM):
         if tools:
             print("Warning: Ollama adapter doesn't fully support tools yet")
 
-        try:
-            response = self.client.chat(
-                model=self.model,
-                messages=ollama_messages,
-                tools=tools,
-                options=options,
-            )
+        return {
+            "model": self.model,
+            "messages": ollama_messages,
+            "tools": tools,
+            "options": options,
+        }
+
+    def _tool_use_block(self, tool_call):
+        """Create a tool_use block that matches Claude's structure."""
+        return type('obj', (object,), {
+            'type': 'tool_use',
+            'id': tool_call["function"].get("name", "tool_call"),  # Use name as id
+            'name': tool_call["function"]["name"],
+            'input': tool_call["function"].get("arguments", {})
+        })()
+
+    def _to_message(self, response) -> OllamaMessage:
+        """Format an Ollama response to match Claude's structure."""
+        ollama_msg = self._build_message(response)
+        ollama_msg.usage = self._usage(response)
+        return ollama_msg
 
-            # Format response to match Claude's structure
-            message = response["message"]
-
-            # TOOL CALL PATH
-            if "tool_calls" in message and message["tool_calls"]:
-                print("tool calling")
-                # Convert Ollama tool calls to Claude-compatible format
-                content_blocks = []
-
-                # Add any text content first
-                if message.get("content"):
-                    content_blocks.append({
-                        "type": "text",
-                        "text": message["content"]
-                    })
-
-                # Add tool call blocks
-                for tool_call in message["tool_calls"]:
-                    # Create a tool_use block that matches Claude's structure
-                    tool_block = type('obj', (object,), {
-                        'type': 'tool_use',
-                        'id': tool_call["function"].get("name", "tool_call"),  # Use name as id
-                        'name': tool_call["function"]["name"],
-                        'input': tool_call["function"].get("arguments", {})
-                    })()
-                    content_blocks.append(tool_block)
-
-                ollama_msg = OllamaMessage(
-                    content=[{"type": "text", "text": ""}],  # Placeholder
-                    role="assistant",
-                    model=self.model,
-                )
-                # Override content with the tool blocks
-                ollama_msg.content = content_blocks
-                ollama_msg.stop_reason = "tool_use"
-                return ollama_msg
-
-            # TEXT PATH
-            content_text = message.get("content", "")
-            return OllamaMessage(
-                content=[{"type": "text", "text": content_text}],
+    def _build_message(self, response) -> OllamaMessage:
+        message = response["message"]
+
+        # TOOL CALL PATH
+        if "tool_calls" in message and message["tool_calls"]:
+            print("tool calling")
+            # Convert Ollama tool calls to Claude-compatible format
+            content_blocks = []
+
+            # Add any text content first
+            if message.get("content"):
+                content_blocks.append({
+                    "type": "text",
+                    "text": message["content"]
+                })
+
+            # Add tool call blocks
+            for tool_call in message["tool_calls"]:
+                content_blocks.append(self._tool_use_block(tool_call))
+
+            ollama_msg = OllamaMessage(
+                content=[{"type": "text", "text": ""}],  # Placeholder
                 role="assistant",
                 model=self.model,
             )
+            # Override content with the tool blocks
+            ollama_msg.content = content_blocks
+            ollama_msg.stop_reason = "tool_use"
+            return ollama_msg
 
-        except Exception as e:
-            print(f"Error calling Ollama: {e}")
-            # Return empty message on error
-            return OllamaMessage(
-                content=[{"type": "text", "text": f"Error: {str(e)}"}],
-                role="assistant",
-                model=self.model,
+        # TEXT PATH
+        content_text = message.get("content", "")
+        return OllamaMessage(
+            content=[{"type": "text", "text": content_text}],
+            role="assistant",
+            model=self.model,
+        )
+
+    @staticmethod
+    def _usage(response) -> Usage:
+        """Usage from a response (or the final streamed chunk)."""
+        return Usage(
+            input_tokens=response.get("prompt_eval_count") or 0,
+            output_tokens=response.get("eval_count") or 0,
+            # Ollama reports durations in nanoseconds; total_duration
+            # includes loading the model, which is part of the cost
+            model_seconds=(response.get("total_duration") or 0) / 1e9,
+            requests=1,
+        )
+
+    @staticmethod
+    def _usage_attributes(response) -> Dict[str, Any]:
+        """Token counts from a response (or the final streamed chunk)."""
+        return {
+            "input_tokens": response.get("prompt_eval_count") or 0,
+            "output_tokens": response.get("eval_count") or 0,
+        }
+
+    def usage_from_message(self, message) -> Usage:
+        return getattr(message, "usage", None) or Usage(requests=1)
+
+    def _error_message(self, error: Exception) -> OllamaMessage:
+        print(f"Error calling Ollama: {error}")
+        # Return empty message on error
+        ollama_msg = OllamaMessage(
+            content=[{"type": "text", "text": f"Error: {str(error)}"}],
+            role="assistant",
+            model=self.model,
+        )
+        ollama_msg.is_error = True
+        return ollama_msg
+
+    @staticmethod
+    def _block_to_dict(block) -> Dict[str, Any]:
+        # Text that accompanies tool calls is kept as a plain dict
+        if isinstance(block, dict):
+            return {"type": "text", "text": block.get("text", "")}
+        if block.type == "tool_use":
+            return {
+                "type": "tool_use",
+                "id": block.id,
+                "name": block.name,
+                "input": block.input,
+            }
+        return {"type": "text", "text": block.text}
+
+    def message_to_dict(self, message: OllamaMessage) -> Dict[str, Any]:
+        return {
+            "role": message.role,
+            "model": message.model,
+            "stop_reason": message.stop_reason,
+            "content": [self._block_to_dict(block) for block in message.content],
+            "usage": message.usage.to_dict() if message.usage else None,
+        }
+
+    def message_from_dict(self, data: Dict[str, Any]) -> OllamaMessage:
+        ollama_msg = OllamaMessage(
+            content=[b for b in data["content"] if b["type"] == "text"],
+            role=data["role"],
+            model=data["model"],
+        )
+        ollama_msg.content = [
+            self._tool_use_block(
+                {"function": {"name": block["name"], "arguments": block["input"]}}
             )
+            if block["type"] == "tool_use"
+            else type('obj', (object,), {'type': 'text', 'text': block['text']})()
+            for block in data["content"]
+        ]
+        ollama_msg.stop_reason = data["stop_reason"]
+        if data.get("usage"):
+            ollama_msg.usage = Usage(**data["usage"])
+        return ollama_msg
+
+    def chat(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ) -> OllamaMessage:
+        """
+        Chat with Ollama, mimicking Claude's interface.
+
+        Note: Ollama doesn't support all features like thinking or tools in the same way.
+        This adapter focuses on basic chat functionality.
+        """
+        request = self._build_request(
+            messages, system=system, temperature=temperature, tools=tools
+        )
+        try:
+            with tracer.span("ollama.chat", model=self.model) as span:
+                response = self.client.chat(**request)
+                span.set_attributes(self._usage_attributes(response))
+            return self._to_message(response)
+        except Exception as e:
+            return self._error_message(e)
+
+    async def achat(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ) -> OllamaMessage:
+        """Async variant of chat() backed by ollama.AsyncClient."""
+        request = self._build_request(
+            messages, system=system, temperature=temperature, tools=tools
+        )
+        try:
+            with tracer.span("ollama.chat", model=self.model) as span:
+                response = await self.async_client.chat(**request)
+                span.set_attributes(self._usage_attributes(response))
+            return self._to_message(response)
+        except Exception as e:
+            return self._error_message(e)
+
+    async def astream(
+        self,
+        messages,
+        system=None,
+        temperature=1.0,
+        stop_sequences=None,
+        tools=None,
+        thinking=False,
+        thinking_budget=1024,
+    ):
+        """Stream a chat response from Ollama as StreamEvents."""
+        request = self._build_request(
+            messages, system=system, temperature=temperature, tools=tools
+        )
+        text_parts = []
+        tool_calls = []
+        final_chunk = {}
+        # Not a with-block: the caller runs between yields and must not
+        # end up inside this span
+        span = tracer.start_span("ollama.chat_stream", model=self.model)
+        try:
+            async for chunk in await self.async_client.chat(**request, stream=True):
+                chunk_message = chunk["message"]
+                if chunk_message.get("content"):
+                    if not text_parts:
+                        span.set_attribute("ttft_ms", round(span.elapsed() * 1000, 3))
+                    text_parts.append(chunk_message["content"])
+                    yield StreamEvent("text", text=chunk_message["content"])
+                for tool_call in chunk_message.get("tool_calls") or []:
+                    tool_calls.append(tool_call)
+                    yield StreamEvent("tool_use", block=self._tool_use_block(tool_call))
+                if chunk.get("done"):
+                    final_chunk = chunk
+                    span.set_attributes(self._usage_attributes(chunk))
+        except Exception as e:
+            tracer.end_span(span, error=e)
+            yield StreamEvent("message", message=self._error_message(e))
+            return
+        except BaseException as e:
+            tracer.end_span(span, error=e)
+            raise
+        tracer.end_span(span)
+
+        # Reassemble the chunks into the response chat() would have returned
+        response = {
+            "message": {"content": "".join(text_parts), "tool_calls": tool_calls},
+            **{
+                key: final_chunk.get(key)
+                for key in ("prompt_eval_count", "eval_count", "total_duration")
+            },
+        }
+        yield StreamEvent("message", message=self._to_message(response))
 
     def _convert_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
-        """Convert MessageParam format to Ollama message format."""
-        ollama_messages = []
-
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-
-            # Handle different content formats
-            if isinstance(content, str):
-                text = content
-            elif isinstance(content, list):
-                # Extract text from content blocks
-                text_parts = []
-                for block in content:
-                    if isinstance(block, dict):
-                        if block.get("type") == "text":
-                            text_parts.append(block.get("text", ""))
-                        elif block.get("type") == "tool_result":
-                            # Handle tool results
-                            text_parts.append(str(block.get("content", "")))
-                    elif hasattr(block, 'text'):
-                        text_parts.append(block.text)
-                    else:
-                        text_parts.append(str(block))
-                text = " ".join(text_parts)
-            else:
-                text = str(content)
-
-            ollama_messages.append({
-                "role": role,
-                "content": text
-            })
+        """
+        Convert MessageParam format to Ollama message format.
+
+        Within a conversation (see current_conversation), the converted
+        history from its previous call is reused for every leading message
+        that is still the same object, so an agent-loop iteration only
+        converts what was appended since. Each conversation has its own
+        history, so conversations sharing this adapter do not evict each
+        other. If the history was rewritten (e.g. by compaction),
+        conversion restarts at the first replaced message. Messages must be
+        replaced, not mutated in place. One-off calls are not cached.
+        """
+        conversation = current_conversation.get()
+        if conversation is None:
+            return [self._convert_message(msg) for msg in messages]
+        sources, converted = self._conversions.setdefault(conversation, ([], []))
+
+        reused = 0
+        limit = min(len(messages), len(sources))
+        while reused < limit and messages[reused] is sources[reused]:
+            reused += 1
 
-        return ollama_messages
+        del sources[reused:]
+        del converted[reused:]
 
+        for msg in messages[reused:]:
+            sources.append(msg)
+            converted.append(self._convert_message(msg))
+
+        return list(converted)
+
+    def _convert_message(self, msg: Dict[str, Any]) -> Dict[str, str]:
+        """Convert a single MessageParam to an Ollama message."""
+        role = msg["role"]
+        content = msg["content"]
+
+        # Handle different content formats
+        if isinstance(content, str):
+            text = content
+        elif isinstance(content, list):
+            # Extract text from content blocks
+            text_parts = []
+            for block in content:
+                if isinstance(block, dict):
+                    if block.get("type") == "text":
+                        text_parts.append(block.get("text", ""))
+                    elif block.get("type") == "tool_result":
+                        # Handle tool results
+                        text_parts.append(str(block.get("content", "")))
+                elif hasattr(block, 'text'):
+                    text_parts.append(block.text)
+                else:
+                    text_parts.append(str(block))
+            text = " ".join(text_parts)
+        else:
+            text = str(content)
+
+        return {
+            "role": role,
+            "content": text
+        }
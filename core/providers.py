@@ -0,0 +1,25 @@
+import importlib
+
+from core.base_llm import BaseLLM
+
+# Provider name -> "module:class". Modules are imported only when their
+# provider is selected, so startup loads one SDK rather than all of them.
+PROVIDERS = {
+    "claude": "core.claude:Claude",
+    "ollama": "core.ollama:Ollama",
+}
+
+
+def register_provider(name: str, target: str):
+    """Make a BaseLLM subclass, given as "module:class", selectable by name."""
+    PROVIDERS[name] = target
+
+
+def load_provider(name: str) -> type[BaseLLM]:
+    """Import and return the class of the named provider."""
+    target = PROVIDERS.get(name)
+    if target is None:
+        names = " or ".join(f"'{provider}'" for provider in PROVIDERS)
+        raise ValueError(f"Invalid LLM_PROVIDER: {name}. Use {names}")
+    module_name, class_name = target.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
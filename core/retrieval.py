@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+import zlib
+from collections import Counter
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    from mcp_client import MCPClient
+
+# Imported by the first ChunkIndex, so that importing this module stays
+# cheap when retrieval is off. Retrieval is optional; everything else
+# works without NumPy.
+np = None
+
+
+def _import_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(
+                'Retrieval requires NumPy: pip install -e ".[retrieval]"'
+            ) from None
+        np = numpy
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def chunk_text(text: str, max_chars: int = 1200, overlap: int = 150) -> list[str]:
+    """
+    Split text into chunks of at most max_chars, preferring paragraph, then
+    line, then word boundaries. Consecutive chunks share up to overlap
+    characters so a passage cut in two is still found whole in one of them.
+    """
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + max_chars)
+        if end < len(text):
+            for separator in ("\n\n", "\n", " "):
+                cut = text.rfind(separator, start + max_chars // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class ChunkIndex:
+    """
+    Local vector index of document chunks for retrieving query context.
+
+    Chunks are embedded by feature hashing: each token's sublinear term
+    frequency goes into one of n_features buckets with a hash-derived sign,
+    so no vocabulary is stored and nothing leaves the machine. Rows are
+    L2-normalized, and IDF weights are applied to the query only, which
+    keeps each document's rows independent of the rest of the corpus. A
+    changed document is therefore re-embedded on its own.
+
+    Requires NumPy.
+    """
+
+    def __init__(
+        self,
+        n_features: int = 1024,
+        chunk_chars: int = 1200,
+        chunk_overlap: int = 150,
+    ):
+        _import_numpy()
+
+        self.n_features = n_features
+        self.chunk_chars = chunk_chars
+        self.chunk_overlap = chunk_overlap
+        # doc_id -> (content hash, chunks, chunk vectors)
+        self._docs: dict[str, tuple[int, list[str], "np.ndarray"]] = {}
+        # Number of chunks each token appears in, for query IDF
+        self._chunk_frequency: Counter = Counter()
+        self._chunk_count = 0
+        # Stacked vectors and (doc_id, chunk) labels of every document,
+        # rebuilt on the first search after a change
+        self._matrix: Optional["np.ndarray"] = None
+        self._labels: list[tuple[str, str]] = []
+        self._doc_rows: dict[str, slice] = {}
+        # token -> (bucket, sign), so each distinct token is hashed once
+        self._buckets: dict[str, tuple[int, float]] = {}
+
+    def __len__(self) -> int:
+        return self._chunk_count
+
+    def _bucket(self, token: str) -> tuple[int, float]:
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            # crc32 rather than hash(), which is salted per process
+            code = zlib.crc32(token.encode())
+            bucket = (code % self.n_features, 1.0 if code & 0x80000000 else -1.0)
+            self._buckets[token] = bucket
+        return bucket
+
+    def _embed(self, counts: Counter) -> "np.ndarray":
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        if not counts:
+            return vector
+        buckets, signs = zip(*map(self._bucket, counts))
+        weights = 1.0 + np.log(np.fromiter(counts.values(), np.float32, len(counts)))
+        np.add.at(vector, list(buckets), np.array(signs, np.float32) * weights)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def update(self, doc_id: str, text: str):
+        """Index a document, replacing its previous chunks if it changed."""
+        content_hash = hash(text)
+        entry = self._docs.get(doc_id)
+        if entry is not None and entry[0] == content_hash:
+            return
+        self.remove(doc_id)
+
+        chunks = chunk_text(text, self.chunk_chars, self.chunk_overlap)
+        vectors = np.zeros((len(chunks), self.n_features), dtype=np.float32)
+        for row, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            self._chunk_frequency.update(counts.keys())
+            vectors[row] = self._embed(counts)
+
+        self._docs[doc_id] = (content_hash, chunks, vectors)
+        self._chunk_count += len(chunks)
+        self._matrix = None
+
+    def remove(self, doc_id: str):
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        _, chunks, _ = entry
+        for chunk in chunks:
+            self._chunk_frequency.subtract(set(tokenize(chunk)))
+        self._chunk_frequency += Counter()  # drops tokens that reached zero
+        self._chunk_count -= len(chunks)
+        self._matrix = None
+
+    def sync(self, documents: Iterable[tuple[str, str]]):
+        """Make the index match documents: add, update and remove as needed."""
+        seen = set()
+        for doc_id, text in documents:
+            seen.add(doc_id)
+            self.update(doc_id, text)
+        for doc_id in [d for d in self._docs if d not in seen]:
+            self.remove(doc_id)
+
+    def _query_vector(self, query: str) -> "np.ndarray":
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        for token in set(tokenize(query)):
+            frequency = self._chunk_frequency.get(token, 0)
+            # BM25-style IDF: words in half the chunks or more carry no weight
+            idf = math.log((self._chunk_count - frequency + 0.5) / (frequency + 0.5))
+            if not frequency or idf <= 0:
+                continue
+            bucket, sign = self._bucket(token)
+            vector[bucket] += sign * idf
+        # Normalized, so scores are cosine similarities in [-1, 1]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        min_score: float = 0.05,
+        exclude: Iterable[str] = (),
+    ) -> list[tuple[str, str, float]]:
+        """Return up to top_k (doc_id, chunk, score) matches, best first."""
+        if not self._chunk_count:
+            return []
+        if self._matrix is None:
+            self._matrix = np.vstack([v for _, _, v in self._docs.values()])
+            self._labels = []
+            self._doc_rows = {}
+            for doc_id, (_, chunks, _) in self._docs.items():
+                start = len(self._labels)
+                self._labels += [(doc_id, chunk) for chunk in chunks]
+                self._doc_rows[doc_id] = slice(start, len(self._labels))
+
+        query_vector = self._query_vector(query)
+        if not query_vector.any():
+            return []
+        scores = self._matrix @ query_vector
+        for doc_id in exclude:
+            if doc_id in self._doc_rows:
+                scores[self._doc_rows[doc_id]] = -np.inf
+
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        return [
+            (*self._labels[row], float(scores[row]))
+            for row in best[np.argsort(-scores[best])]
+            if scores[row] >= min_score
+        ]
+
+
+DOCUMENTS_URI = "docs:://documents"
+
+DOCUMENTS_PAGE_SIZE = 1000
+
+
+async def list_document_ids(client: MCPClient) -> list[str]:
+    """Read every document ID from the server one page at a time."""
+    doc_ids = []
+    offset = 0
+    while offset is not None:
+        page = await client.read_resource(
+            f"{DOCUMENTS_URI}/page/{offset}/{DOCUMENTS_PAGE_SIZE}"
+        )
+        doc_ids.extend(page["doc_ids"])
+        offset = page["next_offset"]
+    return doc_ids
+
+
+class DocumentIndexer:
+    """
+    Keeps a ChunkIndex in step with the documents of an MCP server.
+
+    The first refresh() reads every document once. After that, only
+    documents the server reports as updated, and new ones, are checked.
+    Their version is compared with the indexed one, and only changed
+    documents are read again. Documents are read chunk by chunk through
+    the chunk resource, at most concurrency at a time, and bypass the
+    client's resource cache so the bulk read does not evict it.
+    """
+
+    def __init__(self, index: ChunkIndex, client: MCPClient, concurrency: int = 4):
+        if concurrency < 1:
+            raise ValueError("An indexer needs a concurrency of at least one")
+        self.index = index
+        self.client = client
+        self.concurrency = concurrency
+        # doc_id -> version of the document as indexed
+        self._versions: dict[str, int] = {}
+        # Documents to check on the next refresh; None means all of them
+        self._stale: Optional[set[str]] = None
+        # One refresh at a time, so concurrent chats do not read twice
+        self._refreshing = asyncio.Lock()
+        client.add_resource_listener(self._resource_changed)
+
+    def _resource_changed(self, uri: Optional[str]):
+        prefix = DOCUMENTS_URI + "/"
+        if uri is None:
+            self._stale = None
+        elif uri.startswith(prefix) and self._stale is not None:
+            self._stale.add(uri[len(prefix):].split("/")[0])
+
+    async def _read_document(self, doc_id: str) -> str:
+        parts = []
+        chunk_index = 0
+        while chunk_index is not None:
+            chunk = await self.client.read_resource(
+                f"{DOCUMENTS_URI}/{doc_id}/chunks/{chunk_index}", cached=False
+            )
+            parts.append(chunk["text"])
+            chunk_index = chunk["next_chunk_index"]
+        return "".join(parts)
+
+    async def _refresh_document(self, doc_id: str):
+        info = await self.client.read_resource(
+            f"{DOCUMENTS_URI}/{doc_id}/info", cached=False
+        )
+        if self._versions.get(doc_id) == info["version"]:
+            return
+        text = await self._read_document(doc_id)
+        self.index.update(doc_id, text)
+        # The version read before the text, so an edit made in between is
+        # picked up again by its notification
+        self._versions[doc_id] = info["version"]
+
+    async def refresh(self):
+        """Index new and changed documents, and drop removed ones."""
+        async with self._refreshing:
+            stale, self._stale = self._stale, set()
+            doc_ids = await list_document_ids(self.client)
+
+            present = set(doc_ids)
+            for doc_id in [d for d in self._versions if d not in present]:
+                del self._versions[doc_id]
+                self.index.remove(doc_id)
+
+            checking = [
+                doc_id
+                for doc_id in doc_ids
+                if stale is None or doc_id in stale or doc_id not in self._versions
+            ]
+            pending = iter(checking)
+            done: set[str] = set()
+
+            async def worker():
+                for doc_id in pending:
+                    try:
+                        await self._refresh_document(doc_id)
+                    except Exception as e:
+                        print(f"Warning: could not index {doc_id}: {e}")
+                        continue
+                    done.add(doc_id)
+
+            try:
+                await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+            finally:
+                # Failed and cancelled documents are checked again next time
+                if self._stale is not None:
+                    self._stale.update(d for d in checking if d not in done)
+
+
+def select_within_budget(
+    matches: list[tuple[str, str, float]], token_budget: int
+) -> list[tuple[str, str, float]]:
+    """Keep the best matches whose text fits in token_budget (~4 chars/token)."""
+    selected = []
+    used = 0
+    for match in matches:
+        tokens = len(match[1]) // 4 + 1
+        if used + tokens > token_budget:
+            continue
+        selected.append(match)
+        used += tokens
+    return selected
@@ -1,38 +1,94 @@
+from __future__ import annotations
+
+import asyncio
 import json
-from typing import Optional, Literal, List
+from typing import TYPE_CHECKING, Optional, Literal, List
 from mcp.types import CallToolResult, Tool, TextContent
 from mcp_client import MCPClient
-from anthropic.types import Message, ToolResultBlockParam
+from core.tracing import tracer
+
+if TYPE_CHECKING:
+    from anthropic.types import Message, ToolResultBlockParam
+
+
+class ToolCatalog:
+    """Per-session cache of tool definitions and a tool name -> client index.
+
+    The catalog is built with one ``list_tools`` call per client and reused
+    until a client reports a new ``tools_generation`` (it reconnected or the
+    server sent ``notifications/tools/list_changed``). It also records
+    which tools the server annotates as read-only (``readOnlyHint``).
+    """
+
+    def __init__(self, clients: dict[str, MCPClient]):
+        self._clients = clients
+        self._tools: Optional[list[dict]] = None
+        self._index: dict[str, MCPClient] = {}
+        self._read_only: set[str] = set()
+        self._generations: dict[str, int] = {}
+
+    def _is_stale(self) -> bool:
+        if self._tools is None:
+            return True
+        if self._generations.keys() != self._clients.keys():
+            return True
+        return any(
+            client.tools_generation != self._generations[client_id]
+            for client_id, client in self._clients.items()
+        )
+
+    def invalidate(self) -> None:
+        self._tools = None
+
+    async def _refresh(self) -> None:
+        generations = {
+            client_id: client.tools_generation
+            for client_id, client in self._clients.items()
+        }
+        tools = []
+        index: dict[str, MCPClient] = {}
+        read_only: set[str] = set()
+        for client in self._clients.values():
+            for t in await client.list_tools():
+                if t.name not in index and t.annotations and t.annotations.readOnlyHint:
+                    read_only.add(t.name)
+                tools.append(
+                    {
+                        "name": t.name,
+                        "description": t.description,
+                        "input_schema": t.inputSchema,
+                    }
+                )
+                # First client wins, matching the old linear search order
+                index.setdefault(t.name, client)
+
+        self._tools = tools
+        self._index = index
+        self._read_only = read_only
+        self._generations = generations
+
+    async def get_tools(self) -> list[dict]:
+        """Returns the tool definitions, rebuilding only when stale."""
+        if self._is_stale():
+            await self._refresh()
+        return self._tools
+
+    async def find_client(self, tool_name: str) -> Optional[MCPClient]:
+        """Returns the client serving the tool without any network call."""
+        if self._is_stale():
+            await self._refresh()
+        return self._index.get(tool_name)
+
+    def is_read_only(self, tool_name: str) -> bool:
+        """Whether the tool's server promised it does not change anything."""
+        return tool_name in self._read_only
 
 
 class ToolManager:
     @classmethod
     async def get_all_tools(cls, clients: dict[str, MCPClient]) -> list[Tool]:
         """Gets all tools from the provided clients."""
-        tools = []
-        for client in clients.values():
-            tool_models = await client.list_tools()
-            tools += [
-                {
-                    "name": t.name,
-                    "description": t.description,
-                    "input_schema": t.inputSchema,
-                }
-                for t in tool_models
-            ]
-        return tools
-
-    @classmethod
-    async def _find_client_with_tool(
-        cls, clients: list[MCPClient], tool_name: str
-    ) -> Optional[MCPClient]:
-        """Finds the first client that has the specified tool."""
-        for client in clients:
-            tools = await client.list_tools()
-            tool = next((t for t in tools if t.name == tool_name), None)
-            if tool:
-                return client
-        return None
+        return await ToolCatalog(clients).get_tools()
 
     @classmethod
     def _build_tool_result_part(
@@ -50,58 +106,132 @@ class ToolManager:
         }
 
     @classmethod
-    async def execute_tool_requests(
-        cls, clients: dict[str, MCPClient], message: Message
-    ) -> List[ToolResultBlockParam]:
-        """Executes a list of tool requests against the provided clients."""
-        tool_requests = [
-            block for block in message.content if block.type == "tool_use"
+    async def _execute_tool_request(
+        cls, catalog: ToolCatalog, tool_request
+    ) -> ToolResultBlockParam:
+        """Executes a single tool_use block, turning any failure into an error result."""
+        with tracer.span("tools.call", tool=tool_request.name) as span:
+            result = await cls._call_tool(catalog, tool_request, span)
+            span.set_attribute("is_error", result["is_error"])
+            return result
+
+    @classmethod
+    async def _invoke(
+        cls, client: MCPClient, tool_name: str, tool_input: dict
+    ) -> tuple[str, bool]:
+        """Calls the tool and returns its text content as JSON, and is_error."""
+        tool_output: CallToolResult | None = await client.call_tool(
+            tool_name, tool_input
+        )
+        items = []
+        if tool_output:
+            items = tool_output.content
+        content_list = [
+            item.text for item in items if isinstance(item, TextContent)
         ]
-        tool_result_blocks: list[ToolResultBlockParam] = []
-        for tool_request in tool_requests:
-            tool_use_id = tool_request.id
-            tool_name = tool_request.name
-            tool_input = tool_request.input
-
-            client = await cls._find_client_with_tool(
-                list(clients.values()), tool_name
-            )
+        return json.dumps(content_list), bool(tool_output and tool_output.isError)
+
+    @classmethod
+    async def _invoke_memoized(
+        cls, client: MCPClient, tool_name: str, tool_input: dict, span
+    ) -> tuple[str, bool]:
+        """Like _invoke, but reuses the result of an identical earlier call.
+
+        Only for read-only tools. Results are keyed by tool name and
+        canonical input, and tagged with the input's doc_name so edits to
+        that document (see _call_tool) or resource-updated notifications
+        from the server drop them. Error results are not kept.
+        """
+        doc_name = tool_input.get("doc_name")
+        key = (
+            doc_name if isinstance(doc_name, str) else None,
+            tool_name,
+            json.dumps(tool_input, sort_keys=True, separators=(",", ":")),
+        )
+        loaded = False
+
+        def load():
+            nonlocal loaded
+            loaded = True
+            return cls._invoke(client, tool_name, tool_input)
+
+        content_json, is_error = await client.tool_result_cache.get_or_load(
+            key, load
+        )
+        if is_error:
+            client.tool_result_cache.invalidate(key)
+        span.set_attribute("memoized", not loaded)
+        return content_json, is_error
+
+    @classmethod
+    async def _call_tool(
+        cls, catalog: ToolCatalog, tool_request, span
+    ) -> ToolResultBlockParam:
+        tool_use_id = tool_request.id
+        tool_name = tool_request.name
+        tool_input = tool_request.input
+
+        try:
+            # Inside the try: a server failing to list its tools becomes an
+            # error result for this call instead of aborting the whole turn
+            with tracer.span("tools.find_client"):
+                client = await catalog.find_client(tool_name)
 
             if not client:
-                tool_result_part = cls._build_tool_result_part(
+                return cls._build_tool_result_part(
                     tool_use_id, "Could not find that tool", "error"
                 )
-                tool_result_blocks.append(tool_result_part)
-                continue
 
-            try:
-                tool_output: CallToolResult | None = await client.call_tool(
-                    tool_name, tool_input
-                )
-                items = []
-                if tool_output:
-                    items = tool_output.content
-                content_list = [
-                    item.text for item in items if isinstance(item, TextContent)
-                ]
-                content_json = json.dumps(content_list)
-                tool_result_part = cls._build_tool_result_part(
-                    tool_use_id,
-                    content_json,
-                    "error"
-                    if tool_output and tool_output.isError
-                    else "success",
-                )
-            except Exception as e:
-                error_message = f"Error executing tool '{tool_name}': {e}"
-                print(error_message)
-                tool_result_part = cls._build_tool_result_part(
-                    tool_use_id,
-                    json.dumps({"error": error_message}),
-                    "error"
-                    if tool_output and tool_output.isError
-                    else "success",
+            if catalog.is_read_only(tool_name):
+                content_json, is_error = await cls._invoke_memoized(
+                    client, tool_name, tool_input, span
                 )
+            else:
+                try:
+                    content_json, is_error = await cls._invoke(
+                        client, tool_name, tool_input
+                    )
+                finally:
+                    # Anything may have changed, so forget what was read from
+                    # the document this tool names (or everything, if none).
+                    # Reads still in flight are dropped too.
+                    doc_name = tool_input.get("doc_name")
+                    client.invalidate_tool_results(
+                        doc_name if isinstance(doc_name, str) else None
+                    )
+            return cls._build_tool_result_part(
+                tool_use_id,
+                content_json,
+                "error" if is_error else "success",
+            )
+        except Exception as e:
+            error_message = f"Error executing tool '{tool_name}': {e}"
+            print(error_message)
+            return cls._build_tool_result_part(
+                tool_use_id,
+                json.dumps({"error": error_message}),
+                "error",
+            )
+
+    @classmethod
+    async def execute_tool_requests(
+        cls, catalog: ToolCatalog, message: Message
+    ) -> List[ToolResultBlockParam]:
+        """Executes the message's tool requests concurrently.
 
-            tool_result_blocks.append(tool_result_part)
-        return tool_result_blocks
+        Each client caps its own in-flight calls (see
+        ``MCPClient.max_concurrent_calls``), so one slow server cannot
+        take every slot. Results keep the order of the tool_use blocks.
+        """
+        tool_requests = [
+            block for block in message.content if block.type == "tool_use"
+        ]
+        with tracer.span("tools.execute", count=len(tool_requests)):
+            return list(
+                await asyncio.gather(
+                    *(
+                        cls._execute_tool_request(catalog, tool_request)
+                        for tool_request in tool_requests
+                    )
+                )
+            )
@@ -0,0 +1,264 @@
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+import httpx
+
+
+class Span:
+    """One timed operation, with attributes and a link to its parent."""
+
+    def __init__(
+        self,
+        name: str,
+        parent: Optional["Span"] = None,
+        attributes: Optional[dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: dict[str, Any] = dict(attributes or {})
+        self.error: Optional[str] = None
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: Optional[int] = None
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def elapsed(self) -> float:
+        """Seconds since the span started."""
+        return time.perf_counter() - self._start
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time_ns": self.start_time_ns,
+            "end_time_ns": self.end_time_ns,
+            "duration_ms": round(self.duration * 1000, 3)
+            if self.duration is not None
+            else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class JsonlExporter:
+    """Appends every finished span to a file as one JSON object per line."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def shutdown(self):
+        self._file.close()
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpExporter:
+    """
+    Sends spans to an OpenTelemetry collector over OTLP/HTTP with JSON.
+
+    Spans are batched and posted from a background thread, so a slow or
+    missing collector never delays the agent loop; failed batches are
+    dropped with a warning.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = "http://localhost:4318/v1/traces",
+        service_name: str = "cli-chat",
+        batch_size: int = 256,
+        flush_interval: float = 2.0,
+    ):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def export(self, span: Span):
+        self._queue.put(span)
+
+    def _payload(self, spans: list[Span]) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{
+                    "key": "service.name",
+                    "value": {"stringValue": self.service_name},
+                }]},
+                "scopeSpans": [{
+                    "scope": {"name": "core.tracing"},
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            "parentSpanId": span.parent_id or "",
+                            "name": span.name,
+                            "kind": 1,  # SPAN_KIND_INTERNAL
+                            "startTimeUnixNano": str(span.start_time_ns),
+                            "endTimeUnixNano": str(span.end_time_ns),
+                            "attributes": [
+                                {"key": key, "value": _otlp_value(value)}
+                                for key, value in span.attributes.items()
+                            ],
+                            "status": {"code": 2, "message": span.error}
+                            if span.error
+                            else {"code": 1},
+                        }
+                        for span in spans
+                    ],
+                }],
+            }]
+        }
+
+    def _send(self, client: httpx.Client, spans: list[Span]):
+        try:
+            client.post(self.endpoint, json=self._payload(spans)).raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"Warning: could not export {len(spans)} spans to {self.endpoint}: {e}")
+
+    def _run(self):
+        with httpx.Client(timeout=5.0) as client:
+            batch: list[Span] = []
+            last_flush = time.monotonic()
+            while True:
+                # None is the shutdown signal
+                stopping = False
+                try:
+                    span = self._queue.get(timeout=self.flush_interval)
+                    if span is None:
+                        stopping = True
+                    else:
+                        batch.append(span)
+                except queue.Empty:
+                    pass
+
+                due = time.monotonic() - last_flush >= self.flush_interval
+                if batch and (stopping or due or len(batch) >= self.batch_size):
+                    self._send(client, batch)
+                    batch = []
+                    last_flush = time.monotonic()
+                if stopping:
+                    return
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._worker.join(timeout=10)
+
+
+class Tracer:
+    """
+    Records nested, timed spans across the agent loop.
+
+    Spans opened with span() become the parent of spans opened inside
+    them, including in tasks started from there, since the current span
+    is a context variable. Finished spans go to the exporters and to a
+    bounded in-memory buffer that stats() summarizes.
+    """
+
+    def __init__(self, max_spans: int = 10_000):
+        self.exporters: list = []
+        self.finished: deque[Span] = deque(maxlen=max_spans)
+        self._current: ContextVar[Optional[Span]] = ContextVar(
+            "current_span", default=None
+        )
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    def current_span(self) -> Optional[Span]:
+        return self._current.get()
+
+    def start_span(self, name: str, **attributes) -> Span:
+        """
+        Start a span without making it current; call end_span() when done.
+
+        Use this where a with-block cannot be, such as across the yields of
+        an async generator, whose consumer would otherwise run inside it.
+        """
+        return Span(name, parent=self._current.get(), attributes=attributes)
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.duration = span.elapsed()
+        span.end_time_ns = span.start_time_ns + int(span.duration * 1e9)
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        self.finished.append(span)
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        span = self.start_span(name, **attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self._current.reset(token)
+            self.end_span(span, error=e)
+            raise
+        self._current.reset(token)
+        self.end_span(span)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Latency percentiles per span name over the buffered spans."""
+        durations: dict[str, list[float]] = {}
+        for span in self.finished:
+            durations.setdefault(span.name, []).append(span.duration)
+
+        def percentile(ordered: list[float], q: float) -> float:
+            return ordered[math.ceil(q * len(ordered)) - 1] * 1000
+
+        stats = {}
+        for name, values in durations.items():
+            ordered = sorted(values)
+            stats[name] = {
+                "count": len(ordered),
+                "p50_ms": percentile(ordered, 0.50),
+                "p95_ms": percentile(ordered, 0.95),
+                "p99_ms": percentile(ordered, 0.99),
+                "max_ms": ordered[-1] * 1000,
+                "total_ms": sum(ordered) * 1000,
+            }
+        return stats
+
+    def shutdown(self):
+        for exporter in self.exporters:
+            exporter.shutdown()
+        self.exporters.clear()
+
+
+# Process-wide tracer; it only buffers spans until exporters are added
+tracer = Tracer()
@@ -0,0 +1,167 @@
+from typing import Optional
+
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
+
+
+class Usage:
+    """
+    Provider-independent token and time usage of one or more model calls.
+
+    input_tokens excludes tokens read from or written to the prompt
+    cache, which are counted separately, matching Anthropic's usage.
+    model_seconds is the time spent in the model: the provider's own
+    timing when it reports one, otherwise the request's wall time.
+    """
+
+    def __init__(
+        self,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cache_read_input_tokens: int = 0,
+        cache_creation_input_tokens: int = 0,
+        model_seconds: float = 0.0,
+        requests: int = 0,
+    ):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_input_tokens = cache_read_input_tokens
+        self.cache_creation_input_tokens = cache_creation_input_tokens
+        self.model_seconds = model_seconds
+        self.requests = requests
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(getattr(self, field) for field in USAGE_FIELDS)
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Share of prompt tokens served from the prompt cache."""
+        prompt_tokens = (
+            self.input_tokens
+            + self.cache_read_input_tokens
+            + self.cache_creation_input_tokens
+        )
+        if not prompt_tokens:
+            return 0.0
+        return self.cache_read_input_tokens / prompt_tokens
+
+    def add(self, other: "Usage"):
+        for field in USAGE_FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.model_seconds += other.model_seconds
+        self.requests += other.requests
+
+    def cost(self, prices: Optional[dict[str, float]]) -> Optional[float]:
+        """Cost given prices per million tokens of each USAGE_FIELDS kind."""
+        if not prices:
+            return None
+        return sum(
+            getattr(self, field) * prices.get(field, 0.0) for field in USAGE_FIELDS
+        ) / 1_000_000
+
+    def to_dict(self) -> dict:
+        return {
+            **{field: getattr(self, field) for field in USAGE_FIELDS},
+            "model_seconds": round(self.model_seconds, 3),
+            "requests": self.requests,
+        }
+
+
+def parse_prices(spec: str) -> Optional[dict[str, float]]:
+    """
+    Parse "input,output[,cache_read,cache_write]" prices per million
+    tokens, e.g. "3,15,0.3,3.75". Cache prices default to the input price.
+    """
+    if not spec:
+        return None
+    values = [float(value) for value in spec.split(",")]
+    if len(values) not in (2, 4):
+        raise ValueError(
+            f"Invalid price list: {spec}. Use 'input,output' or "
+            "'input,output,cache_read,cache_write' per million tokens"
+        )
+    if len(values) == 2:
+        values += [values[0], values[0]]
+    return dict(zip(USAGE_FIELDS, values))
+
+
+class UsageBudgetExceeded(Exception):
+    """Raised when recorded usage goes over a UsageBudget limit."""
+
+
+class UsageBudget:
+    """
+    Limits that stop a runaway agent loop. None disables a limit.
+
+    Turn limits cover one user turn, including every model call of its
+    tool loop; session limits cover everything since the chat started.
+    """
+
+    def __init__(
+        self,
+        max_turn_tokens: Optional[int] = None,
+        max_turn_requests: Optional[int] = None,
+        max_session_tokens: Optional[int] = None,
+        max_session_cost: Optional[float] = None,
+        prices: Optional[dict[str, float]] = None,
+    ):
+        if max_session_cost is not None and not prices:
+            raise ValueError("max_session_cost needs prices to compute costs")
+        self.max_turn_tokens = max_turn_tokens
+        self.max_turn_requests = max_turn_requests
+        self.max_session_tokens = max_session_tokens
+        self.max_session_cost = max_session_cost
+        self.prices = prices
+
+
+class UsageTracker:
+    """Aggregates Usage per model call, per turn and per session."""
+
+    def __init__(self, budget: Optional[UsageBudget] = None):
+        self.budget = budget or UsageBudget()
+        self.session = Usage()
+        self.turn = Usage()
+        # Totals of every finished turn, oldest first
+        self.turns: list[Usage] = []
+
+    def start_turn(self):
+        self.turn = Usage()
+
+    def end_turn(self):
+        self.turns.append(self.turn)
+
+    def record(self, usage: Usage):
+        self.turn.add(usage)
+        self.session.add(usage)
+
+    def check_budget(self):
+        """Raise UsageBudgetExceeded if any limit has been reached."""
+        budget = self.budget
+        if budget.max_turn_tokens and self.turn.total_tokens >= budget.max_turn_tokens:
+            raise UsageBudgetExceeded(
+                f"This turn used {self.turn.total_tokens} tokens "
+                f"(limit {budget.max_turn_tokens})"
+            )
+        if budget.max_turn_requests and self.turn.requests >= budget.max_turn_requests:
+            raise UsageBudgetExceeded(
+                f"This turn made {self.turn.requests} model calls "
+                f"(limit {budget.max_turn_requests})"
+            )
+        if (
+            budget.max_session_tokens
+            and self.session.total_tokens >= budget.max_session_tokens
+        ):
+            raise UsageBudgetExceeded(
+                f"This session used {self.session.total_tokens} tokens "
+                f"(limit {budget.max_session_tokens})"
+            )
+        cost = self.session.cost(budget.prices)
+        if budget.max_session_cost and cost is not None and cost >= budget.max_session_cost:
+            raise UsageBudgetExceeded(
+                f"This session cost ${cost:.4f} (limit ${budget.max_session_cost:.2f})"
+            )
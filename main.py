@@ -1,45 +1,159 @@
+import argparse
 import asyncio
 import sys
 import os
+import time
 from dotenv import load_dotenv
-from contextlib import AsyncExitStack
+from contextlib import AsyncExitStack, ExitStack, redirect_stdout
 
-from mcp_client import MCPClient
-from core.claude import Claude
-from core.ollama import Ollama
+from mcp_client import MCPClient, MCPClientPool
+from core.llm_cache import CachedLLM
+from core.providers import load_provider
 
+from core.batch import BatchRunner, read_queries
 from core.cli_chat import CliChat
+from core.fanout import FanOut
+from core.retrieval import ChunkIndex, DocumentIndexer
+from core.tracing import JsonlExporter, OtlpExporter, tracer
+from core.usage import UsageBudget, parse_prices
 from core.cli import CliApp
 
 load_dotenv()
 
-# LLM Provider Selection
-llm_provider = os.getenv("LLM_PROVIDER", "claude").lower()
 
-if llm_provider == "ollama":
-    ollama_model = os.getenv("OLLAMA_MODEL", "llama3.2")
-    print(f"🦙 Using Ollama with model: {ollama_model}")
-    llm_service = Ollama(model=ollama_model)
-elif llm_provider == "claude":
-    claude_model = os.getenv("CLAUDE_MODEL", "")
-    anthropic_api_key = os.getenv("ANTHROPIC_API_KEY", "")
+def create_llm_service():
+    """Build the LLM provider selected by LLM_PROVIDER, wrapped in a cache if enabled.
 
-    assert claude_model, "Error: CLAUDE_MODEL cannot be empty. Update .env"
-    assert anthropic_api_key, (
-        "Error: ANTHROPIC_API_KEY cannot be empty. Update .env"
+    Only the selected provider's SDK is imported.
+    """
+    llm_provider = os.getenv("LLM_PROVIDER", "claude").lower()
+    provider_class = load_provider(llm_provider)
+
+    if llm_provider == "ollama":
+        ollama_model = os.getenv("OLLAMA_MODEL", "llama3.2")
+        print(f"🦙 Using Ollama with model: {ollama_model}")
+        llm_service = provider_class(model=ollama_model)
+    elif llm_provider == "claude":
+        claude_model = os.getenv("CLAUDE_MODEL", "")
+        anthropic_api_key = os.getenv("ANTHROPIC_API_KEY", "")
+
+        assert claude_model, "Error: CLAUDE_MODEL cannot be empty. Update .env"
+        assert anthropic_api_key, (
+            "Error: ANTHROPIC_API_KEY cannot be empty. Update .env"
+        )
+
+        print(f"🤖 Using Claude with model: {claude_model}")
+        llm_service = provider_class(
+            model=claude_model,
+            prompt_caching=os.getenv("CLAUDE_PROMPT_CACHING", "1") == "1",
+        )
+    else:
+        # Providers registered elsewhere are configured by their own code
+        raise ValueError(f"LLM_PROVIDER {llm_provider} has no settings in main.py")
+
+    llm_cache_mode = os.getenv("LLM_CACHE_MODE", "off")
+    if llm_cache_mode != "off":
+        llm_service = CachedLLM(
+            llm_service,
+            cache_dir=os.getenv("LLM_CACHE_DIR", ".llm_cache"),
+            mode=llm_cache_mode,
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024),
+        )
+    return llm_service
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Chat with documents over MCP.")
+    parser.add_argument(
+        "server_scripts",
+        nargs="*",
+        help="Extra MCP servers: scripts to run with uv, or http(s) URLs.",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="PATH",
+        help="Run the queries in this JSONL file ('-' for stdin) instead of the interactive prompt.",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="PATH",
+        default="-",
+        help="Where --batch writes one JSON result per query ('-' for stdout, the default).",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Queries --batch runs at once (default 4).",
+    )
+    return parser.parse_args(argv)
+
+
+async def connect_clients(
+    server_clients: dict[str, MCPClient],
+    timeout: float,
+    required: set[str],
+    allow_partial: bool,
+    stack: AsyncExitStack,
+) -> dict[str, MCPClient]:
+    """Connects every MCP server concurrently and prints a startup report.
+
+    Servers in ``required`` must connect. Other failures abort startup
+    unless ``allow_partial`` is set, in which case they are skipped.
+    """
+
+    async def connect(client_id: str, client: MCPClient) -> float:
+        start = time.perf_counter()
+        await client.connect(timeout=timeout)
+        stack.push_async_callback(client.cleanup)
+        return time.perf_counter() - start
+
+    startup_start = time.perf_counter()
+    results = await asyncio.gather(
+        *(
+            connect(client_id, client)
+            for client_id, client in server_clients.items()
+        ),
+        return_exceptions=True,
+    )
+    startup_time = time.perf_counter() - startup_start
+
+    print(f"MCP servers started in {startup_time:.2f}s:")
+    connected = {}
+    failures = []
+    for (client_id, client), result in zip(server_clients.items(), results):
+        if isinstance(result, BaseException):
+            print(f"  ✗ {client_id}: {result}")
+            failures.append(client_id)
+        else:
+            print(f"  ✓ {client_id}: {result:.2f}s")
+            connected[client_id] = client
+
+    fatal = [
+        client_id
+        for client_id in failures
+        if client_id in required or not allow_partial
+    ]
+    if fatal:
+        raise ConnectionError(
+            f"Could not start MCP servers: {', '.join(fatal)}. "
+            "Set MCP_ALLOW_PARTIAL_STARTUP=1 to continue without optional servers."
+        )
 
-    print(f"🤖 Using Claude with model: {claude_model}")
-    llm_service = Claude(model=claude_model)
-else:
-    raise ValueError(f"Invalid LLM_PROVIDER: {llm_provider}. Use 'claude' or 'ollama'")
+    return connected
 
 
-async def main():
-    claude_service = llm_service
+def report_validation_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Warning: could not validate the model: {task.exception()}")
 
-    server_scripts = sys.argv[1:]
-    clients = {}
+
+async def main(options: argparse.Namespace, stdout=None):
+    server_scripts = options.server_scripts
+    max_concurrent_calls = int(os.getenv("MCP_MAX_CONCURRENT_CALLS", "4"))
+    connect_timeout = float(os.getenv("MCP_CONNECT_TIMEOUT", "30"))
+    allow_partial = os.getenv("MCP_ALLOW_PARTIAL_STARTUP", "0") == "1"
+    resource_cache_ttl = float(os.getenv("MCP_RESOURCE_CACHE_TTL", "30"))
 
     command, args = (
         ("uv", ["run", "mcp_server/mcp_server.py"])
@@ -47,31 +161,151 @@ async def main():
         else ("python", ["mcp_server.py"])
     )
 
-    async with AsyncExitStack() as stack:
-        doc_client = await stack.enter_async_context(
-            MCPClient(command=command, args=args)
+    # Servers given by URL are shared: one session per URL in this process
+    pool = MCPClientPool(
+        max_concurrent_calls=max_concurrent_calls,
+        resource_cache_ttl=resource_cache_ttl,
+    )
+
+    doc_server_url = os.getenv("DOC_SERVER_URL", "")
+    if doc_server_url:
+        # Other users edit the same documents, so listen for their edits
+        doc_client = pool.client(
+            doc_server_url, subscriptions=["docs:://documents"]
+        )
+    else:
+        # stdio servers only inherit a minimal environment, so forward the
+        # document server's own settings explicitly
+        doc_env = {k: v for k, v in os.environ.items() if k.startswith("DOCS_")}
+        doc_client = MCPClient(
+            command=command,
+            args=args,
+            env=doc_env,
+            max_concurrent_calls=max_concurrent_calls,
+            resource_cache_ttl=resource_cache_ttl,
         )
-        clients["doc_client"] = doc_client
 
-        for i, server_script in enumerate(server_scripts):
-            client_id = f"client_{i}_{server_script}"
-            client = await stack.enter_async_context(
-                MCPClient(command="uv", args=["run", server_script])
+    server_clients = {"doc_client": doc_client}
+    for i, server_script in enumerate(server_scripts):
+        if server_script.startswith(("http://", "https://")):
+            server_clients[f"client_{i}_{server_script}"] = pool.client(server_script)
+            continue
+        server_clients[f"client_{i}_{server_script}"] = MCPClient(
+            command="uv",
+            args=["run", server_script],
+            max_concurrent_calls=max_concurrent_calls,
+            resource_cache_ttl=resource_cache_ttl,
+        )
+
+    trace_path = os.getenv("TRACE_JSONL_PATH", "")
+    if trace_path:
+        tracer.add_exporter(JsonlExporter(trace_path))
+    otlp_endpoint = os.getenv("TRACE_OTLP_ENDPOINT", "")
+    if otlp_endpoint:
+        tracer.add_exporter(OtlpExporter(otlp_endpoint))
+
+    async with AsyncExitStack() as stack:
+        stack.callback(tracer.shutdown)
+        stack.push_async_callback(pool.close)
+        # Servers boot in their own processes while this one imports the
+        # provider SDK in a thread, then checks the model in the background
+        connecting = asyncio.create_task(
+            connect_clients(
+                server_clients,
+                timeout=connect_timeout,
+                required={"doc_client"},
+                allow_partial=allow_partial,
+                stack=stack,
             )
-            clients[client_id] = client
+        )
+        try:
+            claude_service = await asyncio.to_thread(create_llm_service)
+        except BaseException:
+            connecting.cancel()
+            raise
+        # Not awaited: a slow or unreachable model endpoint must not delay
+        # the first prompt. validate() prints its own warnings.
+        validating = asyncio.create_task(claude_service.validate())
+        validating.add_done_callback(report_validation_error)
+        stack.callback(validating.cancel)
+        clients = await connecting
+        doc_client = clients["doc_client"]
 
-        chat = CliChat(
-            doc_client=doc_client,
-            clients=clients,
-            claude_service=claude_service,
+        retrieval_indexer = None
+        if os.getenv("ENABLE_RETRIEVAL", "0") == "1":
+            try:
+                retrieval_indexer = DocumentIndexer(
+                    ChunkIndex(), doc_client, concurrency=max_concurrent_calls
+                )
+            except ImportError as e:
+                print(f"Warning: retrieval disabled. {e}")
+
+        max_session_cost = float(os.getenv("USAGE_MAX_SESSION_COST", "0")) or None
+        usage_budget = UsageBudget(
+            max_turn_tokens=int(os.getenv("USAGE_MAX_TURN_TOKENS", "0")) or None,
+            max_turn_requests=int(os.getenv("USAGE_MAX_TURN_REQUESTS", "0")) or None,
+            max_session_tokens=int(os.getenv("USAGE_MAX_SESSION_TOKENS", "0")) or None,
+            max_session_cost=max_session_cost,
+            prices=parse_prices(os.getenv("USAGE_PRICES", "")),
         )
 
-        cli = CliApp(chat)
+        def make_chat() -> CliChat:
+            return CliChat(
+                doc_client=doc_client,
+                clients=clients,
+                claude_service=claude_service,
+                token_budget=int(os.getenv("CHAT_TOKEN_BUDGET", "0")) or None,
+                retrieval_indexer=retrieval_indexer,
+                retrieval_top_k=int(os.getenv("RETRIEVAL_TOP_K", "5")),
+                retrieval_token_budget=int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1500")),
+                usage_budget=usage_budget,
+            )
+
+        if options.batch:
+            await run_batch(make_chat, options, stdout or sys.stdout)
+            return
+
+        fanout = FanOut(
+            make_chat,
+            claude_service,
+            workers=int(os.getenv("FANOUT_WORKERS", "4")),
+            rate=float(os.getenv("FANOUT_RATE", "0")),
+            checkpoint_dir=os.getenv("FANOUT_CHECKPOINT_DIR", ".fanout"),
+        )
+        cli = CliApp(make_chat(), fanout=fanout)
         await cli.initialize()
         await cli.run()
 
 
+async def run_batch(make_chat, options: argparse.Namespace, stdout):
+    with ExitStack() as files:
+        queries = (
+            sys.stdin
+            if options.batch == "-"
+            else files.enter_context(open(options.batch, encoding="utf-8"))
+        )
+        output = (
+            stdout
+            if options.output == "-"
+            else files.enter_context(open(options.output, "w", encoding="utf-8"))
+        )
+        runner = BatchRunner(make_chat, workers=options.workers)
+        start = time.perf_counter()
+        await runner.run(read_queries(queries), output)
+        print(
+            f"Ran {runner.completed} queries ({runner.failed} failed) "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+
 if __name__ == "__main__":
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-    asyncio.run(main())
+    options = parse_args()
+    if options.batch and options.output == "-":
+        # Results own stdout; startup reports and warnings go to stderr
+        results = sys.stdout
+        with redirect_stdout(sys.stderr):
+            asyncio.run(main(options, stdout=results))
+    else:
+        asyncio.run(main(options))
@@ -1,40 +1,206 @@
 import json
 import sys
+import time
 import asyncio
-from typing import Optional, Any
+from typing import Any, Callable, Optional
 from contextlib import AsyncExitStack
 from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+from mcp.shared.exceptions import McpError
 from pydantic import AnyUrl
 
+from core.cache import AsyncTTLCache
+from core.tracing import tracer
+
 
 class MCPClient:
+    """Client for one MCP server.
+
+    The server is either a subprocess spoken to over stdio (command and
+    args) or an already running server at url, reached over streamable
+    HTTP, or SSE when the URL ends in /sse. Resource URIs listed in
+    subscriptions are subscribed to after connecting, so edits made by
+    other clients of a shared server invalidate this client's cache too.
+    """
+
     def __init__(
         self,
-        command: str,
-        args: list[str],
+        command: str = "",
+        args: Optional[list[str]] = None,
         env: Optional[dict] = None,
+        max_concurrent_calls: int = 4,
+        resource_cache_ttl: Optional[float] = 30.0,
+        resource_cache_size: int = 256,
+        url: Optional[str] = None,
+        subscriptions: Optional[list[str]] = None,
     ):
+        if not command and not url:
+            raise ValueError("MCPClient needs either a command or a url")
         self._command = command
-        self._args = args
+        self._args = args or []
         self._env = env
+        self._url = url
+        self._subscriptions = subscriptions or []
+        self.max_concurrent_calls = max_concurrent_calls
+        self._call_slots = asyncio.Semaphore(max_concurrent_calls)
         self._session: Optional[ClientSession] = None
-        self._exit_stack: AsyncExitStack = AsyncExitStack()
-
-    async def connect(self):
-        server_params = StdioServerParameters(
-            command=self._command,
-            args=self._args,
-            env=self._env,
-        )
-        stdio_transport = await self._exit_stack.enter_async_context(
-            stdio_client(server_params)
+        self._runner: Optional[asyncio.Task] = None
+        self._connected: Optional[asyncio.Future] = None
+        self._closing: Optional[asyncio.Event] = None
+        # Bumped whenever the server's tool list may have changed, so callers
+        # holding a cached tool catalog know when to rebuild it.
+        self.tools_generation: int = 0
+        # Cached read_resource results, dropped on resource notifications
+        self.resource_cache = AsyncTTLCache(
+            max_entries=resource_cache_size, ttl=resource_cache_ttl
         )
-        _stdio, _write = stdio_transport
-        self._session = await self._exit_stack.enter_async_context(
-            ClientSession(_stdio, _write)
+        # Memoized results of read-only tools, keyed by
+        # (doc_name or None, tool name, canonical input); see ToolManager
+        self.tool_result_cache = AsyncTTLCache(
+            max_entries=resource_cache_size, ttl=resource_cache_ttl
         )
-        await self._session.initialize()
+        # Called with the URI of each updated resource, or None when any
+        # resource may have changed (reconnects and list changes)
+        self._resource_listeners: list[Callable[[Optional[str]], None]] = []
+
+    @property
+    def name(self) -> str:
+        if self._url:
+            return self._url
+        return " ".join([self._command, *self._args])
+
+    async def connect(self, timeout: Optional[float] = None):
+        """Starts the server and completes the MCP handshake.
+
+        The transport lives in a dedicated task, so several clients can
+        connect concurrently and be cleaned up from any task. Raises
+        ConnectionError naming this server if it fails or exceeds timeout.
+        Connecting a client that is already connected (or connecting) shares
+        that connection, so one client can be handed to several users.
+        """
+        with tracer.span("mcp.connect", server=self.name):
+            await self._connect(timeout)
+
+    async def _connect(self, timeout: Optional[float]):
+        # Only the caller that started the connection tears it down on failure
+        starting = self._runner is None
+        if starting:
+            self._connected = asyncio.get_running_loop().create_future()
+            self._closing = asyncio.Event()
+            self._runner = asyncio.create_task(self._run(self._connected))
+        connected = self._connected
+
+        try:
+            await asyncio.wait_for(asyncio.shield(connected), timeout)
+        except asyncio.TimeoutError:
+            if starting:
+                self._runner.cancel()
+                await self.cleanup()
+            raise ConnectionError(
+                f"Timed out after {timeout}s connecting to MCP server '{self.name}'"
+            ) from None
+        except Exception as e:
+            if starting:
+                await self.cleanup()
+            raise ConnectionError(
+                f"Failed to connect to MCP server '{self.name}': {e}"
+            ) from e
+        except BaseException:
+            # Cancelled (e.g. Ctrl+C during startup): don't leave the
+            # server process running behind a half-made connection
+            if starting:
+                self._runner.cancel()
+                await self.cleanup()
+            raise
+
+    def _transport(self):
+        if self._url is None:
+            return stdio_client(
+                StdioServerParameters(
+                    command=self._command,
+                    args=self._args,
+                    env=self._env,
+                )
+            )
+        if self._url.rstrip("/").endswith("/sse"):
+            return sse_client(self._url)
+        return streamablehttp_client(self._url)
+
+    async def _run(self, connected: asyncio.Future):
+        try:
+            async with AsyncExitStack() as stack:
+                _read, _write, *_ = await stack.enter_async_context(
+                    self._transport()
+                )
+                self._session = await stack.enter_async_context(
+                    ClientSession(
+                        _read, _write, message_handler=self._handle_message
+                    )
+                )
+                await self._session.initialize()
+                await self._subscribe()
+                self.tools_generation += 1
+                self.resource_cache.clear()
+                self.tool_result_cache.clear()
+                self._notify_resource_listeners(None)
+                connected.set_result(None)
+                await self._closing.wait()
+        except Exception as e:
+            # anyio wraps transport failures in exception groups; surface
+            # the underlying error so the startup report is readable
+            while len(getattr(e, "exceptions", ())) == 1:
+                e = e.exceptions[0]
+            if not connected.done():
+                connected.set_exception(e)
+        finally:
+            self._session = None
+
+    async def _subscribe(self):
+        for uri in self._subscriptions:
+            try:
+                await self._session.subscribe_resource(AnyUrl(uri))
+            except McpError as e:
+                # Still usable; cached reads just rely on the TTL instead
+                print(f"Warning: could not subscribe to {uri} on {self.name}: {e}")
+
+    async def _handle_message(self, message) -> None:
+        if not isinstance(message, types.ServerNotification):
+            return
+        notification = message.root
+        if isinstance(notification, types.ToolListChangedNotification):
+            self.tools_generation += 1
+        elif isinstance(notification, types.ResourceUpdatedNotification):
+            # Also drop reads derived from the resource, e.g. its lines
+            uri = str(notification.params.uri)
+            self.resource_cache.invalidate_where(
+                lambda key: key == uri or key.startswith(uri + "/")
+            )
+            # Tool results are tied to documents by name, not URI: drop the
+            # ones for any document named in the URI, and every result not
+            # tied to one document (e.g. searches)
+            segments = set(uri.split("/"))
+            self.tool_result_cache.invalidate_where(
+                lambda key: key[0] is None or key[0] in segments
+            )
+            self._notify_resource_listeners(uri)
+        elif isinstance(notification, types.ResourceListChangedNotification):
+            self.resource_cache.clear()
+            self.tool_result_cache.clear()
+            self._notify_resource_listeners(None)
+
+    def add_resource_listener(self, listener: Callable[[Optional[str]], None]):
+        """Calls listener(uri) whenever a resource changes.
+
+        uri is None when any resource may have changed, e.g. after a
+        reconnect, in which case listeners should assume nothing.
+        """
+        self._resource_listeners.append(listener)
+
+    def _notify_resource_listeners(self, uri: Optional[str]):
+        for listener in self._resource_listeners:
+            listener(uri)
 
     def session(self) -> ClientSession:
         if self._session is None:
@@ -50,7 +216,26 @@ class MCPClient:
     async def call_tool(
         self, tool_name: str, tool_input: dict
     ) -> types.CallToolResult | None:
-        return await self.session().call_tool(tool_name, tool_input)
+        with tracer.span("mcp.call_tool", server=self.name, tool=tool_name) as span:
+            queued_at = time.perf_counter()
+            async with self._call_slots:
+                span.set_attribute(
+                    "queued_ms", round((time.perf_counter() - queued_at) * 1000, 3)
+                )
+                return await self.session().call_tool(tool_name, tool_input)
+
+    def invalidate_tool_results(self, doc_name: Optional[str] = None):
+        """Drops memoized tool results that may depend on doc_name.
+
+        Results not tied to one document go too. Without a doc_name,
+        everything is dropped.
+        """
+        if doc_name is None:
+            self.tool_result_cache.clear()
+            return
+        self.tool_result_cache.invalidate_where(
+            lambda key: key[0] is None or key[0] == doc_name
+        )
 
     async def list_prompts(self) -> list[types.Prompt]:
         result = await self.session().list_prompts()
@@ -60,8 +245,33 @@ class MCPClient:
         result = await self.session().get_prompt(prompt_name, args)
         return result.messages
 
-    async def read_resource(self, uri: str) -> Any:
-        result = await self.session().read_resource(AnyUrl(uri))
+    async def read_resource(self, uri: str, cached: bool = True) -> Any:
+        """Reads a resource, serving repeated and concurrent reads from cache.
+
+        Returned values are shared between callers and must not be mutated.
+        Bulk readers pass cached=False, so reading many resources once does
+        not evict the ones read repeatedly.
+        """
+        with tracer.span("mcp.read_resource", server=self.name, uri=uri) as span:
+            if not cached:
+                span.set_attribute("cached", False)
+                return await self._read_resource(uri)
+            loaded = False
+
+            def load():
+                nonlocal loaded
+                loaded = True
+                return self._read_resource(uri)
+
+            value = await self.resource_cache.get_or_load(uri, load)
+            span.set_attribute("cached", not loaded)
+            return value
+
+    async def _read_resource(self, uri: str) -> Any:
+        # Reads share the call limit with tools, so a burst of them cannot
+        # flood the server
+        async with self._call_slots:
+            result = await self.session().read_resource(AnyUrl(uri))
         resource = result.contents[0]
 
         if isinstance(resource, types.TextResourceContents):
@@ -71,7 +281,15 @@ class MCPClient:
         return resource.text
 
     async def cleanup(self):
-        await self._exit_stack.aclose()
+        if self._runner is None:
+            return
+        self._closing.set()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+        self._connected = None
         self._session = None
 
     async def __aenter__(self):
@@ -82,6 +300,34 @@ class MCPClient:
         await self.cleanup()
 
 
+class MCPClientPool:
+    """
+    Hands out one shared MCPClient per server URL.
+
+    A ClientSession multiplexes concurrent requests, so every user of a
+    server in this process can share one session (and its HTTP
+    connections and resource cache) instead of opening their own.
+    """
+
+    def __init__(self, **client_options):
+        self._client_options = client_options
+        self._clients: dict[str, MCPClient] = {}
+
+    def client(self, url: str, **client_options) -> MCPClient:
+        """Return the client for url; options only apply when it is created."""
+        if url not in self._clients:
+            self._clients[url] = MCPClient(
+                url=url, **{**self._client_options, **client_options}
+            )
+        return self._clients[url]
+
+    async def close(self):
+        await asyncio.gather(
+            *(client.cleanup() for client in self._clients.values())
+        )
+        self._clients.clear()
+
+
 # For testing
 async def main():
     async with MCPClient(
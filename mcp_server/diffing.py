@@ -0,0 +1,199 @@
+from difflib import SequenceMatcher
+
+
+def _common_prefix(a: list[str], b: list[str]) -> int:
+    size = min(len(a), len(b))
+    count = 0
+    while count < size and a[count] == b[count]:
+        count += 1
+    return count
+
+
+def _range(start: int, length: int) -> str:
+    # Unified diff ranges are 1-based; an empty range names the line before it
+    if length == 1:
+        return str(start + 1)
+    return f"{start + 1 if length else start},{length}"
+
+
+def _group_opcodes(opcodes: list[tuple], context: int) -> list[list[tuple]]:
+    """Split opcodes into hunks with up to context equal lines around changes."""
+    opcodes = [op for op in opcodes if op[0] != "equal" or op[2] > op[1]]
+    if not any(tag != "equal" for tag, *_ in opcodes):
+        return []
+    # Trim the leading and trailing equal runs down to the context
+    if opcodes[0][0] == "equal":
+        _, i1, i2, j1, j2 = opcodes[0]
+        opcodes[0] = ("equal", max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if opcodes[-1][0] == "equal":
+        _, i1, i2, j1, j2 = opcodes[-1]
+        opcodes[-1] = ("equal", i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        # A long equal run ends one hunk and starts the next
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, i1 + context, j1, j1 + context))
+            groups.append(group)
+            group = []
+            i1, j1 = i2 - context, j2 - context
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+
+def compact_diff(
+    before: str,
+    after: str,
+    context: int = 2,
+    before_start_line: int = 0,
+    after_start_line: int = 0,
+) -> str:
+    """
+    Return a unified diff of two texts, without file headers.
+
+    The unchanged prefix and suffix lines are trimmed before aligning, so
+    only the changed middle goes through SequenceMatcher. Splitting and
+    trimming still take time linear in the texts; to diff an edit to a
+    stored document, see replacement_diff. The start lines are how many
+    lines precede each text in its document, for the hunk headers.
+    """
+    a = before.splitlines(keepends=True)
+    b = after.splitlines(keepends=True)
+
+    prefix = _common_prefix(a, b)
+    suffix = _common_prefix(a[prefix:][::-1], b[prefix:][::-1])
+    a_end, b_end = len(a) - suffix, len(b) - suffix
+
+    # Only the changed middle is aligned; the trimmed lines are added back
+    # as equal runs so hunks still get their context
+    matcher = SequenceMatcher(None, a[prefix:a_end], b[prefix:b_end], autojunk=False)
+    opcodes = [("equal", 0, prefix, 0, prefix)] + [
+        (tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+    ] + [("equal", a_end, len(a), b_end, len(b))]
+
+    hunks = []
+    for group in _group_opcodes(opcodes, context):
+        a_start, b_start = group[0][1], group[0][3]
+        a_length = group[-1][2] - group[0][1]
+        b_length = group[-1][4] - group[0][3]
+        lines = [
+            f"@@ -{_range(before_start_line + a_start, a_length)} "
+            f"+{_range(after_start_line + b_start, b_length)} @@\n"
+        ]
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines += [" " + line for line in a[i1:i2]]
+                continue
+            lines += ["-" + line for line in a[i1:i2]]
+            lines += ["+" + line for line in b[j1:j2]]
+        hunks.append("".join(
+            line if line.endswith("\n") else line + "\n\\ No newline at end of file\n"
+            for line in lines
+        ))
+    return "".join(hunks)
+
+
+# Bytes read at a time while looking for line boundaries
+BLOCK_SIZE = 4096
+
+
+def _line_start(store, doc_id: str, position: int, newlines: int) -> int:
+    """Offset just after the newlines-th newline before position, or 0."""
+    while position > 0:
+        block_start = max(0, position - BLOCK_SIZE)
+        block = store.read_range(doc_id, block_start, position - block_start)
+        index = len(block)
+        while newlines:
+            index = block.rfind(b"\n", 0, index)
+            if index == -1:
+                break
+            newlines -= 1
+        if not newlines:
+            return block_start + index + 1
+        position = block_start
+    return 0
+
+
+def _line_end(store, doc_id: str, position: int, newlines: int, size: int) -> int:
+    """Offset just after the newlines-th newline from position, or size."""
+    while position < size:
+        block = store.read_range(doc_id, position, BLOCK_SIZE)
+        index = -1
+        while newlines:
+            index = block.find(b"\n", index + 1)
+            if index == -1:
+                break
+            newlines -= 1
+        if not newlines:
+            return position + index + 1
+        position += len(block)
+    return size
+
+
+def replacement_diff(
+    store,
+    doc_id: str,
+    offsets: list[int],
+    old_contents: str,
+    new_contents: str,
+    context: int = 2,
+) -> str:
+    """
+    Return the unified diff of a replace edit from the edited document.
+
+    offsets are where old_contents was replaced, as returned by
+    DocumentStore.replace. Only the lines around each replacement are
+    read and diffed, and the old lines are rebuilt by putting
+    old_contents back. Hunk headers also need each change's line number,
+    which costs a newline count over the bytes before it; the memory
+    store counts in place without copying.
+    """
+    old_bytes, new_bytes = old_contents.encode(), new_contents.encode()
+    shift = len(new_bytes) - len(old_bytes)
+    line_shift = new_bytes.count(b"\n") - old_bytes.count(b"\n")
+    size = store.size(doc_id)
+
+    # [start, end, first, last]: a run of whole lines of the edited
+    # document holding replacements first..last-1 and their context
+    regions: list[list[int]] = []
+    for index, offset in enumerate(offsets):
+        start = offset + index * shift
+        region_start = _line_start(store, doc_id, start, context + 1)
+        region_end = _line_end(store, doc_id, start + len(new_bytes), context + 1, size)
+        if regions and region_start <= regions[-1][1]:
+            regions[-1][1] = max(regions[-1][1], region_end)
+            regions[-1][3] = index + 1
+        else:
+            regions.append([region_start, region_end, index, index + 1])
+
+    hunks = []
+    line = 0
+    position = 0
+    for region_start, region_end, first, last in regions:
+        line += store.count_newlines(doc_id, position, region_start)
+        position = region_start
+        after = store.read_range(doc_id, region_start, region_end - region_start)
+
+        parts = []
+        cursor = 0
+        for index in range(first, last):
+            start = offsets[index] + index * shift - region_start
+            parts += [after[cursor:start], old_bytes]
+            cursor = start + len(new_bytes)
+        parts.append(after[cursor:])
+        before = b"".join(parts)
+
+        hunks.append(
+            compact_diff(
+                before.decode("utf-8"),
+                after.decode("utf-8"),
+                context,
+                before_start_line=line - first * line_shift,
+                after_start_line=line,
+            )
+        )
+    return "".join(hunks)
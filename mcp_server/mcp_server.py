@@ -1,10 +1,19 @@
+import os
+
 from mcp.server.fastmcp import FastMCP
 
 from prompts import register_prompts
 from resources import register_resources
 from tools import register_tools
 
-mcp = FastMCP("DocumentMCP", log_level="ERROR")
+# MCP_TRANSPORT=streamable-http (or sse) serves one shared document store to
+# every client that connects, instead of one subprocess per client
+mcp = FastMCP(
+    "DocumentMCP",
+    log_level="ERROR",
+    host=os.getenv("MCP_HOST", "127.0.0.1"),
+    port=int(os.getenv("MCP_PORT", "8000")),
+)
 
 register_tools(mcp)
 register_resources(mcp)
@@ -12,4 +21,9 @@ register_prompts(mcp)
 
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    transport = os.getenv("MCP_TRANSPORT", "stdio").lower()
+    if transport not in ("stdio", "sse", "streamable-http"):
+        raise ValueError(
+            f"Invalid MCP_TRANSPORT: {transport}. Use 'stdio', 'sse' or 'streamable-http'"
+        )
+    mcp.run(transport=transport)
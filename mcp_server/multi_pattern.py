@@ -0,0 +1,199 @@
+import re
+from collections import deque
+from typing import Iterator
+
+
+class AhoCorasick:
+    """
+    Aho–Corasick automaton that finds every occurrence of many literal
+    patterns in one pass over the text.
+    """
+
+    def __init__(self, patterns: list[str]):
+        if any(not pattern for pattern in patterns):
+            raise ValueError("Patterns must not be empty.")
+
+        self.patterns = patterns
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # Indexes of the patterns that end at each state
+        self._output: list[list[int]] = [[]]
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[tuple[int, int, int]]:
+        """Yield (start, end, pattern_index) for every occurrence, overlaps included."""
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position + 1 - len(patterns[index]), position + 1, index
+
+
+# Below this many literal patterns, CPython's C regex engine scanning an
+# alternation beats the pure-Python automaton; above it, the automaton's
+# cost stays flat while the alternation's grows with every pattern.
+AUTOMATON_MIN_PATTERNS = 256
+
+
+def _literal_candidates(
+    text: str, patterns: list[str], exhaustive: bool
+) -> Iterator[tuple[int, int, int]]:
+    """
+    Yield (start, end, pattern_index) matches of literal patterns.
+
+    With exhaustive=False only the leftmost-longest, non-overlapping
+    matches are needed, which a longest-first alternation finds directly.
+    """
+    if exhaustive or len(patterns) >= AUTOMATON_MIN_PATTERNS:
+        yield from AhoCorasick(patterns).iter_matches(text)
+        return
+
+    # A stable sort keeps the earliest listed of two identical patterns first
+    order = sorted(range(len(patterns)), key=lambda i: -len(patterns[i]))
+    alternation = re.compile(
+        "|".join(f"(?P<_p{i}>{re.escape(patterns[i])})" for i in order)
+    )
+    for match in alternation.finditer(text):
+        yield match.start(), match.end(), int(match.lastgroup[2:])
+
+
+def _next_regex_match(pattern: re.Pattern, text: str, position: int):
+    """The first non-empty match of pattern starting at or after position."""
+    match = pattern.search(text, position)
+    while match is not None and match.end() == match.start():
+        if match.start() >= len(text):
+            return None
+        match = pattern.search(text, match.start() + 1)
+    return match
+
+
+def replace_all(
+    text: str, edits: list[tuple[str, str, bool]]
+) -> tuple[str, list[int]]:
+    """
+    Apply many (old, new, is_regex) replacements to text in a single scan.
+
+    Literal patterns are matched in one pass (Aho–Corasick for large
+    batches). Each regex is compiled on its own, so backreferences,
+    group names and inline flags behave as they would alone, and is
+    searched again only from where the last replacement ended. Where
+    matches overlap, the leftmost one wins, then the longest, then the
+    earliest listed edit; replacements never see each other's output.
+    Regex replacements may use group references such as \\1. Empty
+    regex matches are ignored.
+
+    Returns the new text and the number of replacements made per edit.
+
+    >>> replace_all("abc", [("ab", "X", True), ("abc", "Y", True)])
+    ('Y', [0, 1])
+    >>> replace_all("abc", [("ab", "X", False), ("abc", "Y", False)])
+    ('Y', [0, 1])
+    >>> replace_all(
+    ...     "hello world",
+    ...     [("hello", "H", False), ("ll", "LL", True), ("o w", "X", True), ("world", "W", True)],
+    ... )
+    ('H W', [1, 0, 0, 1])
+    >>> replace_all("abab aba", [(r"(a)b\\1", r"<\\1>", True)])
+    ('<a>b <a>', [2])
+    >>> replace_all("a1 b2", [(r"(?P<d>a)1", "A", True), (r"(?P<d>b)2", "B", True)])
+    ('A B', [1, 1])
+    >>> replace_all("Foo foo", [("(?i)foo", "bar", True), ("o", "0", False)])
+    ('bar bar', [2, 0])
+    """
+    if any(not old for old, _, _ in edits):
+        raise ValueError("Patterns must not be empty.")
+
+    literal_indexes = [i for i, (_, _, is_regex) in enumerate(edits) if not is_regex]
+    regex_indexes = [i for i, (_, _, is_regex) in enumerate(edits) if is_regex]
+
+    literal_candidates: list[tuple[int, int, int]] = []
+    if literal_indexes:
+        # Mixed with regexes, every overlapping literal match must be a
+        # candidate, since a regex match may displace the leftmost one
+        literal_candidates = sorted(
+            (
+                (start, end, literal_indexes[index])
+                for start, end, index in _literal_candidates(
+                    text,
+                    [edits[i][0] for i in literal_indexes],
+                    exhaustive=bool(regex_indexes),
+                )
+            ),
+            key=lambda c: (c[0], c[0] - c[1], c[2]),
+        )
+
+    compiled = {i: re.compile(edits[i][0]) for i in regex_indexes}
+    # The next match of each regex at or after the current position
+    regex_matches = {i: _next_regex_match(compiled[i], text, 0) for i in regex_indexes}
+
+    parts = []
+    counts = [0] * len(edits)
+    position = 0
+    next_literal = 0
+    while True:
+        while (
+            next_literal < len(literal_candidates)
+            and literal_candidates[next_literal][0] < position
+        ):
+            next_literal += 1
+        best = (
+            literal_candidates[next_literal]
+            if next_literal < len(literal_candidates)
+            else None
+        )
+        best_match = None
+
+        for index in regex_indexes:
+            match = regex_matches[index]
+            if match is not None and match.start() < position:
+                match = regex_matches[index] = _next_regex_match(
+                    compiled[index], text, position
+                )
+            if match is None:
+                continue
+            candidate = (match.start(), match.end(), index)
+            if best is None or (
+                (candidate[0], candidate[0] - candidate[1], index)
+                < (best[0], best[0] - best[1], best[2])
+            ):
+                best, best_match = candidate, match
+
+        if best is None:
+            break
+        start, end, index = best
+        new = edits[index][1]
+        if best_match is not None:
+            new = best_match.expand(new)
+        parts.append(text[position:start])
+        parts.append(new)
+        counts[index] += 1
+        position = end
+    parts.append(text[position:])
+
+    return "".join(parts), counts
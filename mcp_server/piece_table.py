@@ -0,0 +1,160 @@
+ORIGINAL = 0
+ADDED = 1
+
+
+class PieceTable:
+    """
+    Byte buffer that supports cheap edits of large documents.
+
+    The text is a sequence of pieces, each a slice of either the read-only
+    original buffer or an append-only buffer holding inserted bytes. An
+    edit only splits pieces and appends the new bytes, so its cost depends
+    on the edit size and the number of pieces, not on the document size.
+    """
+
+    # Past this many pieces, lookups cost more than one copy of the text
+    MAX_PIECES = 2048
+
+    def __init__(self, original: bytes = b""):
+        self._buffers = (bytes(original), bytearray())
+        self._pieces: list[tuple[int, int, int]] = (
+            [(ORIGINAL, 0, len(original))] if original else []
+        )
+        self._length = len(original)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def to_bytes(self) -> bytes:
+        return b"".join(
+            self._buffers[buffer][start:start + length]
+            for buffer, start, length in self._pieces
+        )
+
+    def text(self) -> str:
+        return self.to_bytes().decode("utf-8")
+
+    def slice(self, start: int, end: int) -> bytes:
+        """Return bytes [start, end) without materializing the whole text."""
+        start = max(0, start)
+        end = min(self._length, end)
+        parts = []
+        position = 0
+        for buffer, piece_start, length in self._pieces:
+            if position >= end:
+                break
+            piece_end = position + length
+            if piece_end > start:
+                lo = max(start, position) - position
+                hi = min(end, piece_end) - position
+                parts.append(self._buffers[buffer][piece_start + lo:piece_start + hi])
+            position = piece_end
+        return b"".join(parts)
+
+    def count_newlines(self, start: int, end: int) -> int:
+        """Count the newlines in bytes [start, end), searching pieces in place."""
+        count = 0
+        position = 0
+        for buffer, piece_start, length in self._pieces:
+            if position >= end:
+                break
+            piece_end = position + length
+            if piece_end > start:
+                lo = max(start, position) - position
+                hi = min(end, piece_end) - position
+                count += self._buffers[buffer].count(
+                    b"\n", piece_start + lo, piece_start + hi
+                )
+            position = piece_end
+        return count
+
+    def find_all(self, pattern: bytes) -> list[int]:
+        """
+        Return the offsets of non-overlapping occurrences of pattern.
+
+        Occurrences are chosen left to right, the same way str.replace
+        picks them. Each piece is searched in place; matches that span
+        piece boundaries are found in a small window around each boundary.
+        """
+        size = len(pattern)
+        if not size:
+            raise ValueError("Cannot search for an empty pattern.")
+
+        occurrences = []
+        carry = b""  # last size - 1 bytes before the current piece
+        position = 0
+        for buffer_id, start, length in self._pieces:
+            buffer = self._buffers[buffer_id]
+            end = start + length
+
+            # A match crossing this boundary is counted here only if it
+            # also ends inside this piece; longer ones are found at a later
+            # boundary, so every match is reported once.
+            if carry:
+                window = carry + buffer[start:start + min(length, size - 1)]
+                index = window.find(pattern)
+                while index != -1 and index < len(carry):
+                    occurrences.append(position - len(carry) + index)
+                    index = window.find(pattern, index + 1)
+
+            index = buffer.find(pattern, start, end)
+            while index != -1:
+                occurrences.append(position + index - start)
+                index = buffer.find(pattern, index + 1, end)
+
+            if size > 1:
+                carry = (carry + buffer[max(start, end - (size - 1)):end])[-(size - 1):]
+            position += length
+
+        selected = []
+        next_free = 0
+        for offset in occurrences:
+            if offset >= next_free:
+                selected.append(offset)
+                next_free = offset + size
+        return selected
+
+    def _split(self, offset: int) -> int:
+        """Ensure a piece boundary at offset and return the index after it."""
+        position = 0
+        for index, (buffer, start, length) in enumerate(self._pieces):
+            if offset == position:
+                return index
+            if offset < position + length:
+                cut = offset - position
+                self._pieces[index:index + 1] = [
+                    (buffer, start, cut),
+                    (buffer, start + cut, length - cut),
+                ]
+                return index + 1
+            position += length
+        return len(self._pieces)
+
+    def replace_range(self, start: int, end: int, data: bytes):
+        """Replace bytes [start, end) with data."""
+        if not 0 <= start <= end <= self._length:
+            raise ValueError(f"Invalid range {start}:{end}.")
+
+        first = self._split(start)
+        last = self._split(end)
+        new_pieces = []
+        if data:
+            added = self._buffers[ADDED]
+            new_pieces.append((ADDED, len(added), len(data)))
+            added += data
+        self._pieces[first:last] = new_pieces
+        self._length += len(data) - (end - start)
+
+        if len(self._pieces) > self.MAX_PIECES:
+            self._compact()
+
+    def apply_edits(self, edits: list[tuple[int, int, bytes]]):
+        """Apply sorted, non-overlapping (start, end, data) replacements."""
+        # Last edit first, so earlier offsets stay valid
+        for start, end, data in reversed(edits):
+            self.replace_range(start, end, data)
+
+    def _compact(self):
+        original = self.to_bytes()
+        self._buffers = (original, bytearray())
+        self._pieces = [(ORIGINAL, 0, len(original))] if original else []
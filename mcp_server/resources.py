@@ -1,4 +1,10 @@
+import weakref
+
 from mcp.server import FastMCP
+from mcp.server.fastmcp import Context
+from pydantic import AnyUrl
+
+from storage import create_store
 
 
 docs = {
@@ -11,29 +17,169 @@ docs = {
 }
 
 
+# Seed documents; the configured store serves them from here on
+store = create_store(docs)
+
+
+DOCUMENTS_URI = "docs:://documents"
+
+# Sessions subscribed to each resource URI. Weak references let the
+# sessions of disconnected clients drop out on their own.
+subscribers: dict[str, weakref.WeakSet] = {}
+
+
+async def notify_document_updated(ctx: Context, doc_id: str):
+    """
+    Tell the editing session, and every session subscribed to the document
+    or to the document list, that a document changed.
+    """
+    uri = f"{DOCUMENTS_URI}/{doc_id}"
+    sessions = {ctx.session}
+    for key in (uri, DOCUMENTS_URI):
+        sessions.update(subscribers.get(key, ()))
+    for session in sessions:
+        try:
+            await session.send_resource_updated(AnyUrl(uri))
+        except Exception:
+            # The client went away without unsubscribing
+            for subscribed in subscribers.values():
+                subscribed.discard(session)
+
+
 def list_documents_impl():
     """Implementation of list_documents resource."""
-    return list(docs.keys())
+    return store.list_ids()
+
+
+MAX_PAGE_SIZE = 1000
+
+
+def list_documents_page_impl(offset: int, limit: int):
+    """
+    Implementation of list_documents_page resource.
+
+    limit is capped at MAX_PAGE_SIZE; next_offset is None on the last page.
+    """
+    if offset < 0 or limit < 1:
+        raise ValueError("offset must be >= 0 and limit >= 1.")
+    doc_ids = store.list_ids(offset, min(limit, MAX_PAGE_SIZE))
+    total = store.count()
+    end = offset + len(doc_ids)
+    return {
+        "doc_ids": doc_ids,
+        "total": total,
+        "next_offset": end if end < total else None,
+    }
+
+
+DEFAULT_CHUNK_SIZE = 16 * 1024
 
 
 def get_document_impl(doc_id: str):
     """Implementation of get_document resource."""
-    if doc_id not in docs:
-        raise ValueError(f"The document {doc_id} does not exist.")
-    return docs[doc_id]
+    return store.get(doc_id)
+
+
+def get_document_info_impl(doc_id: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Implementation of get_document_info resource."""
+    size = store.size(doc_id)
+    return {
+        "doc_id": doc_id,
+        "version": store.version(doc_id),
+        "size_bytes": size,
+        "line_count": store.line_count(doc_id),
+        "chunk_size": chunk_size,
+        "chunk_count": max(1, -(-size // chunk_size)),
+    }
+
+
+def get_document_range_impl(doc_id: str, offset: int, length: int):
+    """Implementation of get_document_range resource."""
+    if offset < 0 or length < 0:
+        raise ValueError("offset and length must not be negative.")
+    return store.read_range(doc_id, offset, length).decode("utf-8", errors="ignore")
+
+
+def get_document_lines_impl(doc_id: str, start_line: int, end_line: int):
+    """Implementation of get_document_lines resource."""
+    if start_line < 1 or end_line < start_line:
+        raise ValueError("Lines are numbered from 1 and end_line must be >= start_line.")
+    return store.read_lines(doc_id, start_line, end_line)
+
+
+def _utf8_continuation_bytes(data: bytes, start: int) -> int:
+    """Count UTF-8 continuation bytes (10xxxxxx) in data from start onwards."""
+    count = 0
+    while start + count < len(data) and data[start + count] & 0xC0 == 0x80:
+        count += 1
+    return count
+
+
+def get_document_chunk_impl(
+    doc_id: str, chunk_index: int, chunk_size: int = DEFAULT_CHUNK_SIZE
+):
+    """
+    Implementation of get_document_chunk resource.
+
+    Chunk boundaries are moved forward to the next character start, so
+    concatenating every chunk reproduces the document exactly.
+    """
+    if chunk_index < 0 or chunk_size < 1:
+        raise ValueError("chunk_index must be >= 0 and chunk_size >= 1.")
+
+    chunk_count = max(1, -(-store.size(doc_id) // chunk_size))
+    offset = chunk_index * chunk_size
+    # A UTF-8 character is at most 4 bytes, so 3 extra bytes on each side
+    # are enough to find both character boundaries
+    data = store.read_range(doc_id, offset, chunk_size + 3)
+    start = _utf8_continuation_bytes(data, 0) if chunk_index else 0
+    end = chunk_size + _utf8_continuation_bytes(data, chunk_size)
+    is_last = chunk_index >= chunk_count - 1
+
+    return {
+        "doc_id": doc_id,
+        "chunk_index": chunk_index,
+        "chunk_count": chunk_count,
+        "offset": offset + start,
+        "text": data[start:end].decode("utf-8"),
+        "next_chunk_index": None if is_last else chunk_index + 1,
+    }
 
 
 def register_resources(mcp: FastMCP):
     """Register all resources with the MCP server."""
 
+    # Shared (HTTP) servers have many sessions; subscriptions let each of
+    # them hear about edits made through the others
+    server = mcp._mcp_server
+
+    @server.subscribe_resource()
+    async def subscribe(uri: AnyUrl):
+        session = server.request_context.session
+        subscribers.setdefault(str(uri), weakref.WeakSet()).add(session)
+
+    @server.unsubscribe_resource()
+    async def unsubscribe(uri: AnyUrl):
+        subscribers.get(str(uri), weakref.WeakSet()).discard(
+            server.request_context.session
+        )
+
     @mcp.resource(
-        "docs:://documents",
+        DOCUMENTS_URI,
         description="Return a list of all document IDs available in the system.",
         mime_type="application/json",
     )
     def list_documents():
         return list_documents_impl()
 
+    @mcp.resource(
+        "docs:://documents/page/{offset}/{limit}",
+        description="Return up to limit document IDs from offset, the total count and the next page's offset.",
+        mime_type="application/json",
+    )
+    def list_documents_page(offset: str, limit: str):
+        return list_documents_page_impl(int(offset), int(limit))
+
     @mcp.resource(
         "docs:://documents/{doc_id}",
         description="Return the contents of a particular document given its ID.",
@@ -42,3 +188,35 @@ def register_resources(mcp: FastMCP):
     def get_document(doc_id: str):
         return get_document_impl(doc_id)
 
+    @mcp.resource(
+        "docs:://documents/{doc_id}/info",
+        description="Return the version, size in bytes, line count and chunk count of a document.",
+        mime_type="application/json",
+    )
+    def get_document_info(doc_id: str):
+        return get_document_info_impl(doc_id)
+
+    @mcp.resource(
+        "docs:://documents/{doc_id}/range/{offset}/{length}",
+        description="Return length bytes of a document starting at byte offset.",
+        mime_type="text/plain",
+    )
+    def get_document_range(doc_id: str, offset: str, length: str):
+        return get_document_range_impl(doc_id, int(offset), int(length))
+
+    @mcp.resource(
+        "docs:://documents/{doc_id}/lines/{start_line}/{end_line}",
+        description="Return lines start_line to end_line (1-based, inclusive) of a document.",
+        mime_type="text/plain",
+    )
+    def get_document_lines(doc_id: str, start_line: str, end_line: str):
+        return get_document_lines_impl(doc_id, int(start_line), int(end_line))
+
+    @mcp.resource(
+        "docs:://documents/{doc_id}/chunks/{chunk_index}",
+        description="Return one chunk of a document and the index of the next chunk.",
+        mime_type="application/json",
+    )
+    def get_document_chunk(doc_id: str, chunk_index: str):
+        return get_document_chunk_impl(doc_id, int(chunk_index))
+
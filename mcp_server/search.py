@@ -0,0 +1,103 @@
+import math
+import re
+from collections import Counter
+from typing import Iterable
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return [token.lower() for token in TOKEN_RE.findall(text)]
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index with BM25 ranking.
+
+    Documents can be added, replaced and removed one at a time, so the
+    index is kept current as edits happen instead of being rebuilt.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self._postings: dict[str, dict[str, int]] = {}
+        self._doc_lengths: dict[str, int] = {}
+        self._doc_terms: dict[str, tuple[str, ...]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add_documents(self, documents: Iterable[tuple[str, str]]):
+        for doc_id, text in documents:
+            self.update(doc_id, text)
+
+    def update(self, doc_id: str, text: str):
+        """Index a document, replacing any previous version of it."""
+        self.remove(doc_id)
+
+        counts = Counter(tokenize(text))
+        for term, frequency in counts.items():
+            self._postings.setdefault(term, {})[doc_id] = frequency
+
+        length = sum(counts.values())
+        self._doc_lengths[doc_id] = length
+        self._doc_terms[doc_id] = tuple(counts)
+        self._total_length += length
+
+    def remove(self, doc_id: str):
+        if doc_id not in self._doc_lengths:
+            return
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def search(self, query: str, limit: int = 5) -> list[tuple[str, float]]:
+        """Return up to limit (doc_id, score) pairs, best match first."""
+        doc_count = len(self._doc_lengths)
+        if not doc_count:
+            return []
+
+        average_length = self._total_length / doc_count or 1
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(
+                1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for doc_id, frequency in postings.items():
+                length_norm = 1 - self.b + self.b * (
+                    self._doc_lengths[doc_id] / average_length
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * (
+                    frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+                )
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+
+def make_snippet(text: str, query: str, width: int = 160) -> str:
+    """Return a short excerpt of text around the first query term it contains."""
+    terms = set(tokenize(query))
+    position = 0
+    for match in TOKEN_RE.finditer(text):
+        if match.group().lower() in terms:
+            position = match.start()
+            break
+
+    start = max(0, position - width // 3)
+    if start > 0:
+        # Start at a word boundary instead of mid-word
+        space = text.rfind(" ", 0, start)
+        start = space + 1 if space != -1 and start - space < 20 else start
+    end = min(len(text), start + width)
+    snippet = " ".join(text[start:end].split())
+    return ("..." if start > 0 else "") + snippet + ("..." if end < len(text) else "")
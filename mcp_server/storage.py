@@ -0,0 +1,603 @@
+import itertools
+import mmap
+import os
+import sqlite3
+import stat
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Iterator
+
+from piece_table import PieceTable
+
+
+class VersionConflictError(ValueError):
+    """Raised when an edit's expected_version does not match the document."""
+
+
+class DocumentStore(ABC):
+    """Abstract storage backend for DocumentMCP documents."""
+
+    @abstractmethod
+    def list_ids(self, offset: int = 0, limit: int | None = None) -> list[str]:
+        """
+        Return up to limit document IDs, skipping the first offset.
+
+        IDs come in a stable order (insertion order, or by name for
+        files), so successive pages cover every document once as long as
+        none is added in between. No limit returns the rest.
+        """
+        pass
+
+    def count(self) -> int:
+        """Return the number of documents."""
+        return len(self.list_ids())
+
+    @abstractmethod
+    def exists(self, doc_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    def get(self, doc_id: str) -> str:
+        """Return a document's contents. Raises ValueError if it is missing."""
+        pass
+
+    @abstractmethod
+    def put(self, doc_id: str, contents: str) -> None:
+        """Create or overwrite a document."""
+        pass
+
+    @abstractmethod
+    def version(self, doc_id: str) -> int:
+        """Return the document's version, which increases with every change."""
+        pass
+
+    @abstractmethod
+    def replace(
+        self,
+        doc_id: str,
+        old_contents: str,
+        new_contents: str,
+        expected_version: int | None = None,
+    ) -> tuple[int, list[int]]:
+        """
+        Replace every occurrence of old_contents in a document atomically.
+
+        Returns the document's new version and the byte offsets, in the
+        document as it was, of the occurrences replaced (left to right,
+        non-overlapping, as str.replace picks them). Raises ValueError if
+        it is missing, and VersionConflictError if expected_version is
+        given and another edit got there first.
+        """
+        pass
+
+    @abstractmethod
+    def update(
+        self, doc_id: str, contents: str, expected_version: int | None = None
+    ) -> int:
+        """
+        Overwrite an existing document if it is still at expected_version.
+
+        Returns the document's new version. Raises ValueError if it is
+        missing and VersionConflictError on a version mismatch.
+        """
+        pass
+
+    def iter_documents(self) -> Iterator[tuple[str, str]]:
+        """Yield (doc_id, contents) pairs without loading the whole corpus."""
+        for doc_id in self.list_ids():
+            yield doc_id, self.get(doc_id)
+
+    def versions(self) -> dict[str, int]:
+        """Return every document's current version by ID."""
+        return {doc_id: self.version(doc_id) for doc_id in self.list_ids()}
+
+    def change_marker(self) -> object:
+        """
+        Return a value that changes when another process changes the store.
+
+        Caches of the store compare it between uses and recheck versions
+        when it moved. None, the default, means only this process edits
+        the store.
+        """
+        return None
+
+    # Ranged access. Offsets and sizes are in bytes of the UTF-8 encoding
+    # and lines are numbered from 1. Backends that can avoid loading the
+    # whole document override these defaults.
+
+    def size(self, doc_id: str) -> int:
+        return len(self.get(doc_id).encode())
+
+    def line_count(self, doc_id: str) -> int:
+        contents = self.get(doc_id)
+        trailing = 1 if contents and not contents.endswith("\n") else 0
+        return contents.count("\n") + trailing
+
+    def read_range(self, doc_id: str, offset: int, length: int) -> bytes:
+        return self.get(doc_id).encode()[offset:offset + length]
+
+    def read_lines(self, doc_id: str, start_line: int, end_line: int) -> str:
+        lines = self.get(doc_id).splitlines(keepends=True)
+        return "".join(lines[start_line - 1:end_line])
+
+    def count_newlines(self, doc_id: str, start: int, end: int) -> int:
+        """Count the newlines in bytes [start, end)."""
+        return self.read_range(doc_id, start, end - start).count(b"\n")
+
+
+def _missing(doc_id: str) -> ValueError:
+    return ValueError(f"The document {doc_id} does not exist.")
+
+
+def _check_version(expected_version: int | None, version: int):
+    if expected_version is not None and expected_version != version:
+        raise VersionConflictError(
+            f"Version conflict: expected version {expected_version}, "
+            f"but the document is at version {version}. Read it again and retry."
+        )
+
+
+def _find_all(data: bytes, pattern: bytes) -> list[int]:
+    """Offsets of the occurrences str.replace would replace."""
+    offsets = []
+    index = data.find(pattern)
+    while index != -1:
+        offsets.append(index)
+        index = data.find(pattern, index + len(pattern))
+    return offsets
+
+
+def _check_edit(old_contents: str, expected_version: int | None, version: int):
+    if not old_contents:
+        raise ValueError("old_contents must not be empty.")
+    _check_version(expected_version, version)
+
+
+class MemoryDocumentStore(DocumentStore):
+    """
+    Keeps documents in RAM as piece tables; contents are lost on restart.
+
+    Edits splice the piece table instead of copying the document, so they
+    cost time proportional to the edit rather than the document size.
+    """
+
+    def __init__(self, docs: dict[str, str]):
+        self._docs = {
+            doc_id: PieceTable(contents.encode()) for doc_id, contents in docs.items()
+        }
+        self._versions = {doc_id: 1 for doc_id in docs}
+
+    def _table(self, doc_id: str) -> PieceTable:
+        if doc_id not in self._docs:
+            raise _missing(doc_id)
+        return self._docs[doc_id]
+
+    def list_ids(self, offset: int = 0, limit: int | None = None) -> list[str]:
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(self._docs, offset, stop))
+
+    def count(self) -> int:
+        return len(self._docs)
+
+    def exists(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    def get(self, doc_id: str) -> str:
+        return self._table(doc_id).text()
+
+    def put(self, doc_id: str, contents: str) -> None:
+        self._docs[doc_id] = PieceTable(contents.encode())
+        self._versions[doc_id] = self._versions.get(doc_id, 0) + 1
+
+    def version(self, doc_id: str) -> int:
+        self._table(doc_id)
+        return self._versions[doc_id]
+
+    def replace(
+        self,
+        doc_id: str,
+        old_contents: str,
+        new_contents: str,
+        expected_version: int | None = None,
+    ) -> tuple[int, list[int]]:
+        table = self._table(doc_id)
+        _check_edit(old_contents, expected_version, self._versions[doc_id])
+
+        pattern = old_contents.encode()
+        replacement = new_contents.encode()
+        occurrences = table.find_all(pattern)
+        if occurrences:
+            table.apply_edits(
+                [(start, start + len(pattern), replacement) for start in occurrences]
+            )
+            self._versions[doc_id] += 1
+        return self._versions[doc_id], occurrences
+
+    def update(
+        self, doc_id: str, contents: str, expected_version: int | None = None
+    ) -> int:
+        self._table(doc_id)
+        _check_version(expected_version, self._versions[doc_id])
+        self.put(doc_id, contents)
+        return self._versions[doc_id]
+
+    def size(self, doc_id: str) -> int:
+        return len(self._table(doc_id))
+
+    def read_range(self, doc_id: str, offset: int, length: int) -> bytes:
+        return self._table(doc_id).slice(offset, offset + length)
+
+    def count_newlines(self, doc_id: str, start: int, end: int) -> int:
+        return self._table(doc_id).count_newlines(start, end)
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """
+    Persists documents in a SQLite database.
+
+    Lookups go through the primary key index, so only requested documents
+    are ever loaded. Edits run in an IMMEDIATE transaction, which keeps a
+    read-modify-write atomic even with several server processes sharing
+    the file.
+    """
+
+    def __init__(self, path: str, seed: dict[str, str] | None = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            created = not self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'documents'"
+            ).fetchone()
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id TEXT PRIMARY KEY, contents TEXT NOT NULL, "
+                "version INTEGER NOT NULL DEFAULT 1)"
+            )
+            columns = [
+                row[1] for row in self._conn.execute("PRAGMA table_info(documents)")
+            ]
+            if "version" not in columns:
+                # Databases created before documents were versioned
+                self._conn.execute(
+                    "ALTER TABLE documents ADD COLUMN version INTEGER NOT NULL DEFAULT 1"
+                )
+            if created and seed:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO documents (id, contents) VALUES (?, ?)",
+                    seed.items(),
+                )
+                self._conn.execute("COMMIT")
+
+    def list_ids(self, offset: int = 0, limit: int | None = None) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM documents ORDER BY rowid LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            )
+            return [row[0] for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def exists(self, doc_id: str) -> bool:
+        with self._lock:
+            return bool(
+                self._conn.execute(
+                    "SELECT 1 FROM documents WHERE id = ?", (doc_id,)
+                ).fetchone()
+            )
+
+    def get(self, doc_id: str) -> str:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT contents FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+        if row is None:
+            raise _missing(doc_id)
+        return row[0]
+
+    def put(self, doc_id: str, contents: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents (id, contents) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET "
+                "contents = excluded.contents, version = version + 1",
+                (doc_id, contents),
+            )
+
+    def version(self, doc_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM documents WHERE id = ?", (doc_id,)
+            ).fetchone()
+        if row is None:
+            raise _missing(doc_id)
+        return row[0]
+
+    def replace(
+        self,
+        doc_id: str,
+        old_contents: str,
+        new_contents: str,
+        expected_version: int | None = None,
+    ) -> tuple[int, list[int]]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT contents, version FROM documents WHERE id = ?",
+                    (doc_id,),
+                ).fetchone()
+                if row is None:
+                    raise _missing(doc_id)
+                contents, version = row
+                _check_edit(old_contents, expected_version, version)
+                offsets = _find_all(contents.encode(), old_contents.encode())
+                if offsets:
+                    version += 1
+                    self._conn.execute(
+                        "UPDATE documents SET contents = ?, version = ? WHERE id = ?",
+                        (contents.replace(old_contents, new_contents), version, doc_id),
+                    )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return version, offsets
+
+    def update(
+        self, doc_id: str, contents: str, expected_version: int | None = None
+    ) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT version FROM documents WHERE id = ?", (doc_id,)
+                ).fetchone()
+                if row is None:
+                    raise _missing(doc_id)
+                _check_version(expected_version, row[0])
+                version = row[0] + 1
+                self._conn.execute(
+                    "UPDATE documents SET contents = ?, version = ? WHERE id = ?",
+                    (contents, version, doc_id),
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return version
+
+    def size(self, doc_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT length(CAST(contents AS BLOB)) FROM documents WHERE id = ?",
+                (doc_id,),
+            ).fetchone()
+        if row is None:
+            raise _missing(doc_id)
+        return row[0]
+
+    def read_range(self, doc_id: str, offset: int, length: int) -> bytes:
+        # substr on a BLOB counts bytes, and only the slice leaves SQLite
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT substr(CAST(contents AS BLOB), ?, ?) FROM documents WHERE id = ?",
+                (offset + 1, length, doc_id),
+            ).fetchone()
+        if row is None:
+            raise _missing(doc_id)
+        # substr of an empty BLOB is NULL
+        return bytes(row[0] or b"")
+
+    def versions(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT id, version FROM documents"))
+
+    def change_marker(self) -> object:
+        # Changes when another connection, e.g. another server process,
+        # commits to the database
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def iter_documents(self) -> Iterator[tuple[str, str]]:
+        # A separate connection keeps a long scan from holding the lock
+        conn = sqlite3.connect(self.path)
+        try:
+            yield from conn.execute(
+                "SELECT id, contents FROM documents ORDER BY rowid"
+            )
+        finally:
+            conn.close()
+
+
+class FileDocumentStore(DocumentStore):
+    """
+    Serves each file in a directory as a document named after the file.
+
+    Ranged reads memory-map the file, so reading a slice or a few lines of
+    a large document never loads or copies the rest of it. Edits rewrite
+    the file atomically through a temporary file.
+    """
+
+    def __init__(self, root: str, seed: dict[str, str] | None = None):
+        self.root = root
+        # Versions are tracked per server process, starting at 1, so a
+        # directory must not be shared by several server processes
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+        # mkstemp creates files readable by their owner only; new documents
+        # get the mode open() would give them instead
+        umask = os.umask(0)
+        os.umask(umask)
+        self._new_file_mode = 0o666 & ~umask
+        if not os.path.isdir(root):
+            os.makedirs(root)
+            for doc_id, contents in (seed or {}).items():
+                self.put(doc_id, contents)
+            self._versions.clear()
+
+    def _path(self, doc_id: str) -> str:
+        if not doc_id or doc_id.startswith(".") or os.sep in doc_id or "/" in doc_id:
+            raise ValueError(f"Invalid document name: {doc_id}")
+        return os.path.join(self.root, doc_id)
+
+    def _existing_path(self, doc_id: str) -> str:
+        path = self._path(doc_id)
+        if not os.path.isfile(path):
+            raise _missing(doc_id)
+        return path
+
+    def _names(self) -> Iterator[str]:
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith("."):
+                    yield entry.name
+
+    def list_ids(self, offset: int = 0, limit: int | None = None) -> list[str]:
+        # Name order needs every name, so a page still scans the
+        # directory; it saves sending the whole list
+        names = sorted(self._names())
+        return names[offset:] if limit is None else names[offset:offset + limit]
+
+    def count(self) -> int:
+        return sum(1 for _ in self._names())
+
+    def exists(self, doc_id: str) -> bool:
+        try:
+            return os.path.isfile(self._path(doc_id))
+        except ValueError:
+            return False
+
+    def get(self, doc_id: str) -> str:
+        with open(self._existing_path(doc_id), encoding="utf-8") as f:
+            return f.read()
+
+    def put(self, doc_id: str, contents: str) -> None:
+        path = self._path(doc_id)
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = self._new_file_mode
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(contents)
+            # Keep the document's permissions across the rewrite
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._versions[doc_id] = self._versions.get(doc_id, 1) + 1
+
+    def version(self, doc_id: str) -> int:
+        self._existing_path(doc_id)
+        return self._versions.get(doc_id, 1)
+
+    def replace(
+        self,
+        doc_id: str,
+        old_contents: str,
+        new_contents: str,
+        expected_version: int | None = None,
+    ) -> tuple[int, list[int]]:
+        with self._lock:
+            contents = self.get(doc_id)
+            _check_edit(old_contents, expected_version, self.version(doc_id))
+            offsets = _find_all(contents.encode(), old_contents.encode())
+            if offsets:
+                self.put(doc_id, contents.replace(old_contents, new_contents))
+            return self.version(doc_id), offsets
+
+    def update(
+        self, doc_id: str, contents: str, expected_version: int | None = None
+    ) -> int:
+        with self._lock:
+            _check_version(expected_version, self.version(doc_id))
+            self.put(doc_id, contents)
+            return self.version(doc_id)
+
+    def _map(self, doc_id: str):
+        """Return an open file and a read-only map of it (None if empty)."""
+        f = open(self._existing_path(doc_id), "rb")
+        if os.fstat(f.fileno()).st_size == 0:
+            return f, None
+        return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def size(self, doc_id: str) -> int:
+        return os.path.getsize(self._existing_path(doc_id))
+
+    def line_count(self, doc_id: str) -> int:
+        f, mapped = self._map(doc_id)
+        with f:
+            if mapped is None:
+                return 0
+            with mapped:
+                count = 0
+                position = mapped.find(b"\n")
+                while position != -1:
+                    count += 1
+                    position = mapped.find(b"\n", position + 1)
+                return count + (0 if mapped[-1:] == b"\n" else 1)
+
+    def read_range(self, doc_id: str, offset: int, length: int) -> bytes:
+        f, mapped = self._map(doc_id)
+        with f:
+            if mapped is None:
+                return b""
+            with mapped:
+                return mapped[offset:offset + length]
+
+    def read_lines(self, doc_id: str, start_line: int, end_line: int) -> str:
+        f, mapped = self._map(doc_id)
+        with f:
+            if mapped is None:
+                return ""
+            with mapped:
+                # Walk newlines up to the requested lines; only they are copied
+                start = 0
+                for _ in range(start_line - 1):
+                    start = mapped.find(b"\n", start) + 1
+                    if start == 0:
+                        return ""
+                end = start
+                for _ in range(end_line - start_line + 1):
+                    end = mapped.find(b"\n", end) + 1
+                    if end == 0:
+                        end = len(mapped)
+                        break
+                return mapped[start:end].decode("utf-8", errors="replace")
+
+
+def create_store(seed: dict[str, str]) -> DocumentStore:
+    """
+    Build the store selected by the DOCS_STORE environment variable.
+
+    "memory" (default) serves the seed documents from RAM. "sqlite" uses
+    the database at DOCS_DB_PATH and "files" the directory at DOCS_DIR;
+    both are seeded on first use.
+    """
+    backend = os.getenv("DOCS_STORE", "memory").lower()
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+
+    if backend == "memory":
+        return MemoryDocumentStore(seed)
+    if backend == "sqlite":
+        path = os.getenv("DOCS_DB_PATH", os.path.join(server_dir, "documents.db"))
+        return SQLiteDocumentStore(path, seed=seed)
+    if backend == "files":
+        root = os.getenv("DOCS_DIR", os.path.join(server_dir, "documents"))
+        return FileDocumentStore(root, seed=seed)
+
+    raise ValueError(
+        f"Invalid DOCS_STORE: {backend}. Use 'memory', 'sqlite' or 'files'"
+    )
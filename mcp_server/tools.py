@@ -1,24 +1,174 @@
 from mcp.server import FastMCP
-from pydantic import Field
+from mcp.server.fastmcp import Context
+from mcp.types import ToolAnnotations
+from pydantic import BaseModel, Field
 
-from resources import docs
+from resources import (
+    DEFAULT_CHUNK_SIZE,
+    get_document_chunk_impl,
+    get_document_info_impl,
+    get_document_lines_impl,
+    get_document_range_impl,
+    notify_document_updated,
+    store,
+)
+from diffing import replacement_diff
+from multi_pattern import replace_all
+from search import InvertedIndex, make_snippet
 
+# Clients may memoize results of read-only tools until a document changes
+READ_ONLY = ToolAnnotations(readOnlyHint=True)
+EDITS_DOCUMENT = ToolAnnotations(readOnlyHint=False, destructiveHint=False)
 
-def read_doc_contents_impl(doc_name: str):
+# Built on the first search rather than at import, so a large corpus
+# does not delay the MCP handshake. Edited documents are re-indexed on the
+# next search, which keeps an edit's cost independent of document size.
+search_index: InvertedIndex | None = None
+stale_doc_ids: set[str] = set()
+# Version of each document as indexed, and the store's change marker when
+# they were last checked; edits by other server processes move the marker
+indexed_versions: dict[str, int] = {}
+indexed_marker: object = None
+
+
+def _mark_external_changes():
+    """Mark documents changed by other processes since the last check as stale."""
+    global indexed_marker
+    marker = store.change_marker()
+    if marker is None or marker == indexed_marker:
+        return
+    # Read first, so an edit landing during the check moves it again
+    indexed_marker = marker
+    versions = store.versions()
+    stale_doc_ids.update(
+        doc_id for doc_id, version in versions.items()
+        if indexed_versions.get(doc_id) != version
+    )
+    stale_doc_ids.update(doc_id for doc_id in indexed_versions if doc_id not in versions)
+
+
+def get_search_index() -> InvertedIndex:
+    global search_index, indexed_marker
+    if search_index is None:
+        indexed_marker = store.change_marker()
+        # Versions before contents: an edit in between is re-indexed later
+        indexed_versions.update(store.versions())
+        search_index = InvertedIndex()
+        search_index.add_documents(store.iter_documents())
+        stale_doc_ids.clear()
+    _mark_external_changes()
+    while stale_doc_ids:
+        doc_id = stale_doc_ids.pop()
+        if store.exists(doc_id):
+            indexed_versions[doc_id] = store.version(doc_id)
+            search_index.update(doc_id, store.get(doc_id))
+        else:
+            indexed_versions.pop(doc_id, None)
+            search_index.remove(doc_id)
+    return search_index
+
+
+def read_doc_contents_impl(
+        doc_name: str,
+        offset: int | None = None,
+        length: int | None = None,
+        start_line: int | None = None,
+        end_line: int | None = None,
+):
     """Implementation of read_doc_contents tool."""
-    if doc_name not in docs:
-        raise ValueError(f"The document {doc_name} does not exist.")
-    return docs[doc_name]
+    if start_line is not None or end_line is not None:
+        start_line = start_line or 1
+        end_line = end_line or store.line_count(doc_name)
+        return get_document_lines_impl(doc_name, start_line, end_line)
+    if offset is not None or length is not None:
+        offset = offset or 0
+        length = length if length is not None else store.size(doc_name) - offset
+        return get_document_range_impl(doc_name, offset, length)
+    return store.get(doc_name)
+
 
+EDIT_RESPONSE_MODES = ("ack", "diff", "full")
 
-def edit_doc_contents_impl(doc_name: str, old_contents: str, new_contents: str):
+
+def edit_doc_contents_impl(
+        doc_name: str,
+        old_contents: str,
+        new_contents: str,
+        expected_version: int | None = None,
+        response_mode: str = "diff",
+):
     """Implementation of edit_doc_contents tool."""
-    if doc_name not in docs:
-        raise ValueError(f"The document {doc_name} does not exist.")
+    if response_mode not in EDIT_RESPONSE_MODES:
+        raise ValueError(
+            f"Invalid response_mode: {response_mode}. Use 'ack', 'diff' or 'full'"
+        )
+
+    version, offsets = store.replace(
+        doc_name, old_contents, new_contents, expected_version
+    )
+    stale_doc_ids.add(doc_name)
+
+    if response_mode == "full":
+        return store.get(doc_name)
+
+    # Returning only what changed keeps the whole document out of the
+    # conversation, where it would be re-sent on every later turn
+    result = {
+        "doc_id": doc_name,
+        "version": version,
+        "changed": bool(offsets),
+    }
+    if response_mode == "diff":
+        result["diff"] = replacement_diff(
+            store, doc_name, offsets, old_contents, new_contents
+        )
+    return result
+
+
+class BatchEdit(BaseModel):
+    old: str = Field(..., description="Text to find, or a regular expression if regex is true.")
+    new: str = Field(..., description="Replacement text. Regex replacements may use group references such as \\1.")
+    regex: bool = Field(False, description="Treat old as a regular expression.")
+
+
+def edit_doc_batch_impl(
+        doc_name: str,
+        edits: list[BatchEdit],
+        expected_version: int | None = None,
+):
+    """Implementation of edit_doc_batch tool."""
+    version = store.version(doc_name)
+    if expected_version is None:
+        expected_version = version
+    contents = store.get(doc_name)
+
+    new_contents, counts = replace_all(
+        contents, [(edit.old, edit.new, edit.regex) for edit in edits]
+    )
+    if new_contents != contents:
+        # Fails if the document changed since it was read, so the batch is
+        # applied to exactly the text it was matched against, or not at all
+        version = store.update(doc_name, new_contents, expected_version)
+        stale_doc_ids.add(doc_name)
 
-    updated_contents = docs[doc_name].replace(old_contents, new_contents)
-    docs[doc_name] = updated_contents
-    return updated_contents
+    return {
+        "doc_id": doc_name,
+        "version": version,
+        "matches": counts,
+        "total": sum(counts),
+    }
+
+
+def search_documents_impl(query: str, limit: int = 5):
+    """Implementation of search_documents tool."""
+    return [
+        {
+            "doc_id": doc_id,
+            "score": round(score, 3),
+            "snippet": make_snippet(store.get(doc_id), query),
+        }
+        for doc_id, score in get_search_index().search(query, limit)
+    ]
 
 
 def register_tools(mcp: FastMCP):
@@ -26,22 +176,88 @@ def register_tools(mcp: FastMCP):
 
     @mcp.tool(
         name="read_doc_contents",
-        description="Read the contents of a document given its name. Return the contents as text.",
+        description="Read the contents of a document given its name. Return the contents as text. For large documents, pass a line range or a byte offset/length to read only part of it; use get_doc_info to see the size first.",
+        annotations=READ_ONLY,
     )
     def read_doc_contents(
             doc_name: str = Field(..., description="The name of the document to read."),
+            offset: int | None = Field(None, description="Byte offset to start reading from."),
+            length: int | None = Field(None, description="Number of bytes to read."),
+            start_line: int | None = Field(None, description="First line to read, starting at 1."),
+            end_line: int | None = Field(None, description="Last line to read (inclusive)."),
+    ):
+        return read_doc_contents_impl(doc_name, offset, length, start_line, end_line)
+
+    @mcp.tool(
+        name="get_doc_info",
+        description="Return the version, size in bytes, line count and chunk count of a document without reading it.",
+        annotations=READ_ONLY,
+    )
+    def get_doc_info(
+            doc_name: str = Field(..., description="The name of the document."),
+    ):
+        return get_document_info_impl(doc_name)
+
+    @mcp.tool(
+        name="read_doc_chunk",
+        description="Read a large document one chunk at a time. Start with chunk_index 0 and continue with the returned next_chunk_index until it is null.",
+        annotations=READ_ONLY,
+    )
+    def read_doc_chunk(
+            doc_name: str = Field(..., description="The name of the document to read."),
+            chunk_index: int = Field(0, description="Index of the chunk to read, starting at 0."),
+            chunk_size: int = Field(DEFAULT_CHUNK_SIZE, description="Chunk size in bytes."),
     ):
-        return read_doc_contents_impl(doc_name)
+        return get_document_chunk_impl(doc_name, chunk_index, chunk_size)
 
     @mcp.tool(
         name="edit_doc_contents",
-        description="Edit the contents of a document given its name and new contents using find and replace. Return the updated contents as text.",
+        description="Edit the contents of a document given its name and new contents using find and replace. Return the new version and a unified diff of the change; set response_mode to 'full' to get the whole updated document instead, or 'ack' for the version only.",
+        annotations=EDITS_DOCUMENT,
     )
-    def edit_doc_contents(
+    async def edit_doc_contents(
+            ctx: Context,
             doc_name: str = Field(..., description="The name of the document to edit."),
             old_contents: str = Field(..., description="The old contents of the document."),
             new_contents: str = Field(..., description="The new contents of the document."),
+            expected_version: int | None = Field(None, description="Only apply the edit if the document is still at this version (see get_doc_info). Use it when other sessions may edit the same document."),
+            response_mode: str = Field("diff", description="What to return: 'diff' (default), 'ack' or 'full'."),
     ):
-        return edit_doc_contents_impl(doc_name, old_contents, new_contents)
+        previous_version = store.version(doc_name)
+        result = edit_doc_contents_impl(
+            doc_name, old_contents, new_contents, expected_version, response_mode
+        )
+        # Lets clients drop their cached copy of the document; an edit that
+        # matched nothing leaves their copies valid
+        if store.version(doc_name) != previous_version:
+            await notify_document_updated(ctx, doc_name)
+        return result
 
+    @mcp.tool(
+        name="edit_doc_batch",
+        description="Apply many find-and-replace edits to a document in one call. All edits are matched against the original text in a single pass and applied together, or not at all. Where matches overlap, the leftmost, then longest, then earliest listed edit wins. Return the new version and the number of matches of each edit.",
+        annotations=EDITS_DOCUMENT,
+    )
+    async def edit_doc_batch(
+            ctx: Context,
+            doc_name: str = Field(..., description="The name of the document to edit."),
+            edits: list[BatchEdit] = Field(..., description="The edits to apply."),
+            expected_version: int | None = Field(None, description="Only apply the edits if the document is still at this version (see get_doc_info)."),
+    ):
+        previous_version = store.version(doc_name)
+        result = edit_doc_batch_impl(doc_name, edits, expected_version)
+        # Matches whose replacement equals the original change nothing
+        if result["version"] != previous_version:
+            await notify_document_updated(ctx, doc_name)
+        return result
 
+    @mcp.tool(
+        name="search_documents",
+        description="Full-text search across all documents. Return the best matching document names with a short snippet of each, ranked by relevance. Use this to find which documents mention something before reading them.",
+        annotations=READ_ONLY,
+    )
+    def search_documents(
+            query: str = Field(..., description="Words to search for."),
+            limit: int = Field(5, description="Maximum number of documents to return."),
+    ):
+        return search_documents_impl(query, limit)